@@ -0,0 +1,79 @@
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Ниже этого числа строк оценка PostgreSQL неточна, дешевле посчитать.
+ESTIMATE_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который для нефильтрованных больших таблиц PostgreSQL
+    берёт оценку числа строк из статистики вместо COUNT(*)."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= ESTIMATE_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+
+class IdRangeFilter(admin.SimpleListFilter):
+    """Фильтр по id связанного объекта: «15» или диапазон «10-20»."""
+    template = 'admin/input_filter.html'
+    field_name = None
+
+    def lookups(self, request, model_admin):
+        return (('', ''),)
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(
+                remove=[self.parameter_name]
+            ),
+            'query_parts': [
+                (key, value)
+                for key, value in changelist.get_filters_params().items()
+                if key != self.parameter_name
+            ],
+        }
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        start, _, end = value.partition('-')
+        try:
+            start = int(start)
+            end = int(end) if end else start
+        except ValueError:
+            return queryset.none()
+        return queryset.filter(**{
+            f'{self.field_name}__gte': start,
+            f'{self.field_name}__lte': end,
+        })
+
+
+def id_range_filter(field_name, title):
+    return type(f'{field_name.title()}RangeFilter', (IdRangeFilter,), {
+        'field_name': field_name,
+        'parameter_name': field_name,
+        'title': title,
+    })
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Настройки списка объектов для больших таблиц."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
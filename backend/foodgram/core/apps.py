@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .db_router import install_query_counter
+        from .metrics import install_query_collector
+        connection_created.connect(install_query_counter)
+        connection_created.connect(install_query_collector)
@@ -0,0 +1,6 @@
+"""Общее для команд замеров производительности."""
+
+
+def percentile(values, percent):
+    """Процентиль отсортированного списка значений."""
+    return values[min(len(values) - 1, len(values) * percent // 100)]
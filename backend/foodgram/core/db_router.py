@@ -0,0 +1,69 @@
+import random
+import threading
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Реплика, из которой читает текущий запрос; None - читать из основной базы.
+read_alias = ContextVar('read_alias', default=None)
+
+# Только из основной базы читаются токены (токен, только что выданный при
+# входе, может ещё не дойти до реплики, и запрос с ним получит 401) и
+# DatabaseCache, в котором хранится привязка клиента после записи.
+PRIMARY_APPS = ('authtoken', 'django_cache')
+
+_lock = threading.Lock()
+_query_counts = Counter()
+
+
+def choose_replica():
+    """Одна случайная реплика на весь запрос, чтобы все его чтения
+    видели одно и то же состояние данных."""
+    if not settings.DATABASE_REPLICAS:
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+class ReplicaRouter:
+    """Направляет чтения в реплику, выбранную ReplicaMiddleware.
+
+    Вне запросов (команды, миграции), внутри транзакции основной базы и
+    для моделей из PRIMARY_APPS чтение идёт в основную базу, запись -
+    всегда в неё.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if (
+            alias is None
+            or model._meta.app_label in PRIMARY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        return obj1._state.db in aliases and obj2._state.db in aliases
+
+
+def count_query(execute, sql, params, many, context):
+    with _lock:
+        _query_counts[context['connection'].alias] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def query_counts():
+    """Число запросов по псевдонимам баз с момента запуска процесса."""
+    with _lock:
+        return dict(_query_counts)
@@ -0,0 +1,149 @@
+"""Фоновая выгрузка списков покупок в PDF.
+
+Очередь - таблица ShoppingListExport: веб-процесс добавляет задачу, а
+команда run_export_worker забирает задачи и рисует PDF в пуле процессов.
+Брокер сообщений не нужен. Одинаковые списки покупок, в том числе у
+разных пользователей, выгружаются один раз, пока файл не устарел.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.models import ShoppingListExport, ShoppingListItem
+from .pdf import render_shopping_list
+
+
+def get_items(user):
+    """Позиции списка покупок пользователя в порядке вывода в PDF."""
+    return [
+        {'name': name, 'amount': str(amount), 'unit': unit}
+        for name, unit, amount in ShoppingListItem.objects.filter(
+            user=user
+        ).order_by('ingredient__name').values_list(
+            'ingredient__name', 'ingredient__measurement_unit',
+            'total_amount',
+        )
+    ]
+
+
+def get_cart_hash(items):
+    return hashlib.sha256(
+        json.dumps(items, ensure_ascii=False, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def get_expires():
+    return timezone.now() + timedelta(
+        seconds=settings.SHOPPING_LIST_EXPORT_TTL
+    )
+
+
+def active():
+    """Задачи, результат которых ещё не устарел."""
+    return ShoppingListExport.objects.filter(
+        Q(expires__isnull=True) | Q(expires__gt=timezone.now())
+    )
+
+
+def start_export(user, items=None):
+    """Ставит выгрузку списка покупок в очередь.
+
+    Если такой же список уже выгружается для пользователя, возвращает
+    эту задачу, а если уже выгружен кем-либо - сразу готовую задачу с
+    тем же файлом.
+    """
+    if items is None:
+        items = get_items(user)
+    cart_hash = get_cart_hash(items)
+    queued = active().filter(
+        user=user, cart_hash=cart_hash,
+        status__in=(ShoppingListExport.PENDING, ShoppingListExport.RUNNING),
+    ).first()
+    if queued is not None:
+        return queued
+    done = active().filter(
+        cart_hash=cart_hash, status=ShoppingListExport.DONE
+    ).exclude(file='').first()
+    if done is not None and default_storage.exists(done.file.name):
+        now = timezone.now()
+        return ShoppingListExport.objects.create(
+            user=user, cart_hash=cart_hash, status=ShoppingListExport.DONE,
+            file=done.file.name, started=now, finished=now,
+            expires=get_expires(),
+        )
+    return ShoppingListExport.objects.create(
+        user=user, cart_hash=cart_hash, items=items
+    )
+
+
+def render(items):
+    """Выполняется в процессе пула: только PDF, без обращений к базе."""
+    return render_shopping_list(items).getvalue()
+
+
+def claim(limit):
+    """Забирает до limit задач из очереди.
+
+    Задача достаётся тому обработчику, чей UPDATE сменил её состояние,
+    поэтому обработчиков может быть несколько.
+    """
+    if limit <= 0:
+        return []
+    pks = list(ShoppingListExport.objects.filter(
+        status=ShoppingListExport.PENDING
+    ).order_by('pk').values_list('pk', flat=True)[:limit])
+    claimed = [
+        pk for pk in pks
+        if ShoppingListExport.objects.filter(
+            pk=pk, status=ShoppingListExport.PENDING
+        ).update(status=ShoppingListExport.RUNNING, started=timezone.now())
+    ]
+    return list(ShoppingListExport.objects.filter(pk__in=claimed))
+
+
+def finish(job, content):
+    job.file.save(f'{job.cart_hash}.pdf', ContentFile(content), save=False)
+    job.status = ShoppingListExport.DONE
+    job.items = []
+    job.finished = timezone.now()
+    job.expires = get_expires()
+    job.save(update_fields=['file', 'status', 'items', 'finished',
+                            'expires'])
+
+
+def fail(job, error):
+    job.status = ShoppingListExport.FAILED
+    job.error = str(error) or error.__class__.__name__
+    job.finished = timezone.now()
+    job.expires = get_expires()
+    job.save(update_fields=['status', 'error', 'finished', 'expires'])
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи остановившихся обработчиков."""
+    return ShoppingListExport.objects.filter(
+        status=ShoppingListExport.RUNNING,
+        started__lt=timezone.now() - timedelta(
+            seconds=settings.SHOPPING_LIST_EXPORT_TIMEOUT
+        ),
+    ).update(status=ShoppingListExport.PENDING, started=None)
+
+
+def cleanup():
+    """Удаляет устаревшие задачи и файлы, на которые больше никто не
+    ссылается."""
+    expired = ShoppingListExport.objects.filter(expires__lte=timezone.now())
+    names = set(expired.exclude(file='').values_list('file', flat=True))
+    deleted, _ = expired.delete()
+    names -= set(ShoppingListExport.objects.filter(
+        file__in=names
+    ).values_list('file', flat=True))
+    for name in names:
+        default_storage.delete(name)
+    return deleted
@@ -13,3 +13,27 @@ class Base64ImageField(serializers.ImageField):
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
 
         return super().to_internal_value(data)
+
+
+class ReferencePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Поле связи, которое ищет объект в справочнике, а в базе - только
+    если его нет в снимке."""
+
+    def __init__(self, registry, **kwargs):
+        self.registry = registry
+        kwargs.setdefault('queryset', registry.model.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        # Объект мог появиться в другом процессе до проверки версии
+        # справочника, тогда resolve найдёт его в базе.
+        obj = self.registry.resolve([pk]).get(pk)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
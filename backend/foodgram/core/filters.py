@@ -1,47 +1,59 @@
-from django.db.models import Q
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as django_filters
-from rest_framework import filters
 
-from recipes.models import Recipe, Tag
+from recipes.models import Favorite, Recipe, RecipeTag, Shoplist
+from . import reference, search
 
 
 class RecipeFilter(django_filters.FilterSet):
-    tags = django_filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
+    tags = django_filters.MultipleChoiceFilter(
+        choices=lambda: [
+            (tag.slug, tag.name) for tag in reference.tags.get().objects
+        ],
         field_name='tags__slug',
-        to_field_name='slug',
+        method='filter_tags',
     )
     is_in_shopping_cart = django_filters.BooleanFilter(
         field_name='is_in_shopping_cart', method='filter_is_in_shopping_cart')
     is_favorited = django_filters.BooleanFilter(
         field_name='is_favorited', method='filter_is_favorited')
+    search = django_filters.CharFilter(method='filter_search')
+    ordering = django_filters.ChoiceFilter(
+        choices=(('popular', 'По популярности'),),
+        method='filter_ordering',
+    )
 
     def filter_tags(self, queryset, name, value):
-        values = self.request.GET.getlist(key='tags', default=[])
         if not value:
             return queryset
-        queries = [Q(tags__slug=value) for value in values]
-        query = queries.pop()
-        for item in queries:
-            query |= item
-        return queryset.filter(query).distinct()
-
-    def __is_something(self, queryset, name, value, related_field):
+        tag_ids = [
+            tag.pk for tag in reference.tags.get().objects
+            if tag.slug in value
+        ]
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=tag_ids
+        )))
+
+    def __is_something(self, queryset, value, model):
         if self.request.user.is_anonymous:
-            return Recipe.objects.none() if value else queryset
-        objects = getattr(self.request.user, related_field).all()
-        return queryset.filter(pk__in=[item.recipe.pk for item in objects])
+            return queryset.none() if value else queryset
+        in_list = Exists(model.objects.filter(
+            user=self.request.user, recipe=OuterRef('pk')
+        ))
+        return queryset.filter(in_list if value else ~in_list)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        return self.__is_something(queryset, name, value, 'shoplist')
+        return self.__is_something(queryset, value, Shoplist)
 
     def filter_is_favorited(self, queryset, name, value):
-        return self.__is_something(queryset, name, value, 'favorited')
+        return self.__is_something(queryset, value, Favorite)
+
+    def filter_search(self, queryset, name, value):
+        return search.filter_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by('-favorites_count', '-id')
 
     class Meta:
         model = Recipe
         fields = ('author',)
-
-
-class IngredientsSearchFilter(filters.SearchFilter):
-    search_param = 'name'
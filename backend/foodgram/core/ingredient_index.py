@@ -0,0 +1,56 @@
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+from . import reference
+
+
+def normalize(name):
+    return name.strip().lower().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """Поиск ингредиентов по началу названия без обращения к базе.
+
+    Названия хранятся отсортированными по нормализованному виду, поэтому
+    совпадения с префиксом идут подряд, а точное совпадение всегда первое.
+    Индекс строится по справочнику ингредиентов и перестраивается вместе
+    с ним.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _build(self, snapshot):
+        rows = sorted(
+            (normalize(item['name']), item['id'], item)
+            for item in snapshot.payload
+        )
+        return [row[0] for row in rows], [row[2] for row in rows], snapshot
+
+    def _get_state(self, snapshot=None):
+        if snapshot is None:
+            snapshot = reference.ingredients.get()
+        state = self._state
+        if state is not None and state[2] is snapshot:
+            return state
+        with self._lock:
+            if self._state is state:
+                self._state = self._build(snapshot)
+            return self._state
+
+    def search(self, query, limit=None, snapshot=None):
+        if limit is None:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        prefix = normalize(query)
+        keys, items, _ = self._get_state(snapshot)
+        start = end = bisect_left(keys, prefix)
+        stop = min(len(keys), start + limit)
+        while end < stop and keys[end].startswith(prefix):
+            end += 1
+        return items[start:end]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,223 @@
+import json
+import subprocess
+import time
+from contextlib import ExitStack
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.benchmarks import percentile
+from recipes.models import Favorite, Follow, Recipe, Shoplist
+from users.models import User
+
+URLCONFS = ('recipes.api.urls', 'users.api.urls')
+METHODS = ('get', 'post', 'put', 'patch', 'delete')
+# Действия, которые можно повторять парой «добавить, удалить» без
+# следа в базе.
+TOGGLES = ('add_delete_favorite', 'add_remove_shopping_list', 'create')
+
+
+def clean(pattern):
+    return str(pattern).lstrip('^').rstrip('$')
+
+
+def walk(patterns, prefix=''):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from walk(pattern.url_patterns,
+                            prefix + clean(pattern.pattern))
+        elif isinstance(pattern, URLPattern):
+            yield prefix + clean(pattern.pattern), pattern
+
+
+def get_methods(callback):
+    """Метод HTTP -> действие view."""
+    actions = dict(getattr(callback, 'actions', None) or {})
+    view = getattr(callback, 'cls', None)
+    if view is None:
+        return actions
+    for method in METHODS:
+        if (method in view.http_method_names
+                and method not in actions and hasattr(view, method)):
+            actions[method] = method
+    return actions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Замер задержки и числа SQL-запросов для каждого маршрута API '
+            'с выводом в JSON для сравнения между коммитами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='email пользователя, от имени '
+                                           'которого идут запросы')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--output', help='Файл для JSON, по умолчанию '
+                                             'stdout')
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'Пользователь {email} не найден')
+            return user
+        user = User.objects.order_by('-recipes_count', 'pk').first()
+        if user is None:
+            raise CommandError('В базе нет пользователей, сначала '
+                               'запустите generate_fixtures')
+        return user
+
+    def get_kwargs(self, pattern, callback):
+        """Значения параметров пути: объекты, которых ещё нет в
+        избранном, корзине и подписках пользователя, чтобы пары
+        «добавить, удалить» отрабатывали успешно."""
+        kwargs = {}
+        for name in pattern.pattern.regex.groupindex:
+            if name == 'format':
+                continue
+            view = getattr(callback, 'cls', None)
+            queryset = getattr(view, 'queryset', None)
+            model = queryset.model if queryset is not None else User
+            if name == 'user_id' or model is User:
+                pk = self.author_id
+            elif model is Recipe:
+                pk = self.recipe_id
+            else:
+                pk = model.objects.values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            kwargs[name] = pk
+        return kwargs
+
+    def measure(self, client, method, path):
+        with ExitStack() as stack:
+            contexts = [
+                stack.enter_context(CaptureQueriesContext(connection))
+                for connection in connections.all()
+            ]
+            start = time.perf_counter()
+            response = getattr(client, method)(path)
+            elapsed = (time.perf_counter() - start) * 1000
+        return (response.status_code, elapsed,
+                sum(len(context) for context in contexts))
+
+    def run_route(self, client, route, calls):
+        """Гоняет последовательность вызовов маршрута и собирает
+        статистику по каждому методу."""
+        samples = {method: [] for method, _, _ in calls}
+        for number in range(self.warmup + self.repeat):
+            for method, action, path in calls:
+                status, elapsed, queries = self.measure(client, method, path)
+                if number >= self.warmup:
+                    samples[method].append((elapsed, queries, status))
+        results = []
+        for method, action, path in calls:
+            latencies = sorted(sample[0] for sample in samples[method])
+            queries = sorted(sample[1] for sample in samples[method])
+            results.append({
+                'route': route,
+                'method': method.upper(),
+                'action': action,
+                'path': path,
+                'status': sorted({sample[2] for sample in samples[method]}),
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'queries_min': queries[0],
+                'queries_max': queries[-1],
+            })
+        return results
+
+    def get_patterns(self):
+        seen = set()
+        for urlconf in URLCONFS:
+            for route, pattern in walk(import_module(urlconf).urlpatterns):
+                # Дубликаты с суффиксом формата и корень API не нужны.
+                if ('format' in pattern.pattern.regex.groupindex
+                        or pattern.name in (None, 'api-root')
+                        or pattern.name in seen):
+                    continue
+                seen.add(pattern.name)
+                yield '/api/' + route, pattern
+
+    def get_calls(self, route, pattern):
+        """Вызовы маршрута для замера и пропущенные методы."""
+        methods = get_methods(pattern.callback)
+        kwargs = self.get_kwargs(pattern, pattern.callback)
+        if kwargs is None:
+            return [], [{'route': route,
+                         'reason': 'нет данных для параметров пути'}]
+        path = reverse(pattern.name, kwargs=kwargs)
+        calls = []
+        if 'get' in methods:
+            calls.append(('get', methods['get'], path))
+        if methods.get('post') in TOGGLES and 'delete' in methods and kwargs:
+            calls.append(('post', methods['post'], path))
+            calls.append(('delete', methods['delete'], path))
+        measured = {call[0] for call in calls}
+        skipped = [
+            {'route': route, 'method': method.upper(), 'action': action,
+             'reason': 'изменяет данные'}
+            for method, action in methods.items() if method not in measured
+        ]
+        return calls, skipped
+
+    def handle(self, *args, **options):
+        self.repeat = max(options['repeat'], 1)
+        self.warmup = max(options['warmup'], 0)
+        user = self.get_user(options['user'])
+        self.author_id = User.objects.exclude(pk=user.pk).exclude(
+            pk__in=Follow.objects.filter(user=user).values('following')
+        ).order_by('-recipes_count', 'pk').values_list(
+            'pk', flat=True
+        ).first()
+        self.recipe_id = Recipe.objects.exclude(
+            pk__in=Favorite.objects.filter(user=user).values('recipe')
+        ).exclude(
+            pk__in=Shoplist.objects.filter(user=user).values('recipe')
+        ).order_by('-pk').values_list('pk', flat=True).first()
+        client = APIClient()
+        client.force_authenticate(user)
+        routes = []
+        skipped = []
+        for route, pattern in self.get_patterns():
+            calls, route_skipped = self.get_calls(route, pattern)
+            skipped += route_skipped
+            if calls:
+                routes += self.run_route(client, route, calls)
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'date': timezone.now().isoformat(),
+                'database': connections['default'].vendor,
+                'user': user.email,
+                'repeat': self.repeat,
+                'warmup': self.warmup,
+                'recipes': Recipe.objects.count(),
+                'users': User.objects.count(),
+            },
+            'routes': routes,
+            'skipped': skipped,
+        }
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(text + '\n')
+        else:
+            self.stdout.write(text)
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import quote
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+
+from core.benchmarks import percentile
+from recipes.models import Recipe
+
+
+def asgi_caller(application):
+    async def call(path, query):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+        response = {}
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+
+        await application(scope, receive, send)
+        return response.get('status')
+    return call
+
+
+def wsgi_caller(application, threads):
+    executor = ThreadPoolExecutor(max_workers=threads)
+
+    def request(path, query):
+        environ = {
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'REQUEST_METHOD': 'GET',
+            'HTTP_HOST': 'localhost',
+            'wsgi.input': BytesIO(),
+        }
+        setup_testing_defaults(environ)
+        status = []
+
+        def start_response(line, headers, exc_info=None):
+            status.append(int(line.split()[0]))
+
+        result = application(environ, start_response)
+        try:
+            for _ in result:
+                pass
+        finally:
+            result.close()
+        return status[0]
+
+    async def call(path, query):
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, request, path, query
+        )
+    return call
+
+
+async def run_level(call, urls, concurrency, total):
+    """Гоняет total запросов силами concurrency одновременных клиентов."""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def client():
+        nonlocal errors
+        for number in counter:
+            path, _, query = urls[number % len(urls)].partition('?')
+            query = quote(query, safe='=&%')
+            start = time.perf_counter()
+            status = await call(path, query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, errors
+
+
+class Command(BaseCommand):
+    help = ('Сравнение пути чтения под ASGI с асинхронными view и под WSGI '
+            'при разном числе одновременных соединений')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=('asgi', 'wsgi', 'both'),
+                            default='both')
+        parser.add_argument('--concurrency', nargs='+', type=int,
+                            default=[50, 200, 1000])
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Запросов на каждый уровень нагрузки')
+        parser.add_argument('--wsgi-threads', type=int, default=4,
+                            help='Потоков WSGI-сервера, как --threads '
+                                 'у gunicorn')
+        parser.add_argument('--urls', nargs='+')
+
+    def get_urls(self, options):
+        if options['urls']:
+            return options['urls']
+        urls = ['/api/recipes/', '/api/tags/', '/api/ingredients/?name=а']
+        recipe_id = Recipe.objects.values_list('pk', flat=True).first()
+        if recipe_id is not None:
+            urls.append(f'/api/recipes/{recipe_id}/')
+        return urls
+
+    def run_child(self, server, argv):
+        # Набор URL зависит от ASYNC_READ_VIEWS при загрузке настроек,
+        # поэтому каждый сервер замеряется в отдельном процессе.
+        env = dict(os.environ, ASYNC_READ_VIEWS='1' if server == 'asgi'
+                   else '')
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+        env['PYTHONPATH'] = os.pathsep.join(
+            filter(None, [str(settings.BASE_DIR), env.get('PYTHONPATH')])
+        )
+        completed = subprocess.run(
+            [sys.executable, '-m', 'django', 'benchmark_read_path',
+             '--server', server, *argv],
+            env=env,
+        )
+        if completed.returncode:
+            raise CommandError(f'Замер {server} завершился с ошибкой')
+
+    def handle(self, *args, **options):
+        if options['server'] == 'both':
+            argv = [
+                '--concurrency', *map(str, options['concurrency']),
+                '--requests', str(options['requests']),
+                '--wsgi-threads', str(options['wsgi_threads']),
+            ]
+            if options['urls']:
+                argv += ['--urls', *options['urls']]
+            self.stdout.write(
+                f'{"server":<24} {"conns":>6} {"req/s":>8} '
+                f'{"p50, ms":>8} {"p95, ms":>8} {"p99, ms":>8} '
+                f'{"errors":>7}'
+            )
+            self.stdout.flush()
+            for server in ('wsgi', 'asgi'):
+                self.run_child(server, argv)
+            return
+        urls = self.get_urls(options)
+        if options['server'] == 'asgi':
+            call = asgi_caller(get_asgi_application())
+            label = 'asgi, async views' if settings.ASYNC_READ_VIEWS else (
+                'asgi, sync views')
+        else:
+            call = wsgi_caller(get_wsgi_application(),
+                               options['wsgi_threads'])
+            label = f'wsgi, {options["wsgi_threads"]} threads'
+        # Прогрев: справочники, индекс ингредиентов и кэш страниц.
+        asyncio.run(run_level(call, urls, 1, len(urls)))
+        for concurrency in options['concurrency']:
+            elapsed, latencies, errors = asyncio.run(run_level(
+                call, urls, concurrency, options['requests']
+            ))
+            latencies.sort()
+            self.stdout.write(
+                f'{label:<24} {concurrency:>6} '
+                f'{len(latencies) / elapsed:>8.0f} '
+                f'{percentile(latencies, 50):>8.1f} '
+                f'{percentile(latencies, 95):>8.1f} '
+                f'{percentile(latencies, 99):>8.1f} {errors:>7}'
+            )
+            self.stdout.flush()
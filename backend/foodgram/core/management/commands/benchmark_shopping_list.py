@@ -0,0 +1,46 @@
+import resource
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from core.pdf import register_font, render_shopping_list
+
+
+class Command(BaseCommand):
+    help = 'Замер времени и памяти при формировании PDF списка покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int,
+                            default=[10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        register_font()
+        self.stdout.write(
+            f'{"items":>6} {"pages":>6} {"median, ms":>11} '
+            f'{"max, ms":>9} {"peak alloc, KiB":>16} {"max RSS, MiB":>13}'
+        )
+        for size in options['sizes']:
+            items = [
+                {'name': f'Ингредиент {i}', 'amount': i % 997 + 0.5,
+                 'unit': 'г'}
+                for i in range(size)
+            ]
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                pdf = render_shopping_list(items)
+                timings.append((time.perf_counter() - start) * 1000)
+            tracemalloc.start()
+            render_shopping_list(items)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            pages = pdf.getvalue().count(b'/Type /Page\n')
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.stdout.write(
+                f'{size:>6} {pages:>6} {statistics.median(timings):>11.1f} '
+                f'{max(timings):>9.1f} {peak / 1024:>16.0f} '
+                f'{max_rss / 1024:>13.1f}'
+            )
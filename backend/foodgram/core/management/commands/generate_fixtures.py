@@ -0,0 +1,194 @@
+import random
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+
+from core import recipe_cache, search
+from core.versions import bump_versions
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTag, Shoplist, Tag)
+from users.models import User
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#B56576', 'baking'),
+)
+WORDS = (
+    'домашний', 'быстрый', 'сытный', 'лёгкий', 'праздничный', 'острый',
+    'сливочный', 'бабушкин', 'летний', 'пряный',
+)
+DISHES = (
+    'суп', 'салат', 'пирог', 'омлет', 'рагу', 'плов', 'соус', 'паштет',
+    'кекс', 'борщ', 'запеканка', 'гуляш',
+)
+AMOUNTS = (Decimal('1'), Decimal('2'), Decimal('5'), Decimal('50'),
+           Decimal('100'), Decimal('150'), Decimal('200'), Decimal('500'))
+
+
+def default_ingredients_path():
+    for path in (settings.BASE_DIR.parent.parent / 'data' / 'ingredients.csv',
+                 settings.BASE_DIR / 'ingredients.csv'):
+        if path.is_file():
+            return str(path)
+    return 'ingredients.csv'
+
+
+def zipf_weights(count, exponent=1.1):
+    """Веса популярности: немногие элементы встречаются очень часто."""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class Command(BaseCommand):
+    help = ('Генерация синтетических пользователей, рецептов, подписок, '
+            'избранного и корзин для замеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--ingredients',
+                            default=default_ingredients_path(),
+                            help='Файл справочника, если ингредиентов нет')
+
+    def bulk_create(self, model, objects):
+        """bulk_create с заранее известными id.
+
+        Там, где база не возвращает id из массовой вставки (SQLite в
+        Django 3.2), id назначаются подряд после максимального.
+        """
+        if not connection.features.can_return_rows_from_bulk_insert:
+            start = (model.objects.aggregate(pk=Max('pk'))['pk'] or 0) + 1
+            for pk, obj in enumerate(objects, start):
+                obj.pk = pk
+        return model.objects.bulk_create(objects, self.batch_size)
+
+    def create_users(self, count, prefix):
+        password = make_password('password')
+        return self.bulk_create(User, [
+            User(
+                email=f'{prefix}{number}@example.com',
+                username=f'{prefix}{number}',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password,
+            )
+            for number in range(count)
+        ])
+
+    def create_recipes(self, users, count, ingredients, tags):
+        rng = self.rng
+        # Немногие активные авторы пишут большую часть рецептов.
+        authors = rng.choices(users, zipf_weights(len(users), 0.8), k=count)
+        recipes = self.bulk_create(Recipe, [
+            Recipe(
+                author=author,
+                name=f'{rng.choice(WORDS).capitalize()} {rng.choice(DISHES)}',
+                text='Смешать, приготовить и подать к столу.',
+                cooking_time=rng.randint(5, 180),
+            )
+            for author in authors
+        ])
+        ingredient_weights = zipf_weights(len(ingredients))
+        tag_weights = zipf_weights(len(tags), 0.5)
+        recipe_ingredients = []
+        recipe_tags = []
+        for recipe in recipes:
+            size = round(rng.triangular(3, 15, 7))
+            chosen = set(rng.choices(ingredients, ingredient_weights, k=size))
+            recipe_ingredients.extend(
+                RecipeIngredient(recipe=recipe, ingredient_id=pk,
+                                 amount=rng.choice(AMOUNTS))
+                for pk in chosen
+            )
+            chosen = set(rng.choices(tags, tag_weights, k=rng.randint(1, 3)))
+            recipe_tags.extend(
+                RecipeTag(recipe=recipe, tag_id=pk) for pk in chosen
+            )
+        RecipeIngredient.objects.bulk_create(
+            recipe_ingredients, self.batch_size
+        )
+        RecipeTag.objects.bulk_create(recipe_tags, self.batch_size)
+        return recipes, authors
+
+    def create_relations(self, model, users, targets, field, max_count):
+        """Связи пользователей с популярными объектами без повторов."""
+        rng = self.rng
+        weights = zipf_weights(len(targets))
+        objects = []
+        for user in users:
+            chosen = set(rng.choices(
+                targets, weights, k=rng.randint(0, max_count)
+            ))
+            chosen.discard(user.pk)
+            objects.extend(
+                model(user=user, **{field: pk}) for pk in chosen
+            )
+        model.objects.bulk_create(objects, self.batch_size)
+        return len(objects)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = f'fixture{options["seed"]}_'
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Данные с --seed {options["seed"]} уже созданы, '
+                'укажите другой'
+            )
+        if not Ingredient.objects.exists():
+            call_command('import_ingredients', options['ingredients'],
+                         stdout=self.stdout)
+        Tag.objects.bulk_create(
+            [Tag(name=name, color=color, slug=slug)
+             for name, color, slug in TAGS],
+            ignore_conflicts=True,
+        )
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+        tags = list(Tag.objects.values_list('pk', flat=True))
+        # Порядок по популярности случаен, но повторяем для одного seed.
+        self.rng.shuffle(ingredients)
+        with transaction.atomic():
+            users = self.create_users(options['users'], prefix)
+            recipes, authors = self.create_recipes(
+                users, options['recipes'], ingredients, tags
+            )
+            recipe_ids = [recipe.pk for recipe in recipes]
+            popular_authors = list(dict.fromkeys(
+                author.pk for author in authors
+            ))
+            follows = self.create_relations(
+                Follow, users, popular_authors, 'following_id', 20
+            )
+            favorites = self.create_relations(
+                Favorite, users, recipe_ids, 'recipe_id', 30
+            )
+            carts = self.create_relations(
+                Shoplist, users, recipe_ids, 'recipe_id', 5
+            )
+            bump_versions('tags', 'ingredients', 'recipes', 'users',
+                          'favorites')
+            recipe_cache.bump_generations(recipe_cache.REFERENCE)
+        for start in range(0, len(recipe_ids), self.batch_size):
+            search.update_index(recipe_ids[start:start + self.batch_size])
+        # Массовая вставка не отправляет сигналы: счётчики и сводные
+        # списки покупок пересчитываются отдельно.
+        call_command('repair_counters', stdout=self.stdout)
+        call_command('rebuild_shopping_lists', stdout=self.stdout)
+        call_command('rebuild_similar_recipes', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, рецептов: '
+            f'{len(recipes)}, подписок: {follows}, избранного: '
+            f'{favorites}, в корзинах: {carts} '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
@@ -1,19 +1,87 @@
 import csv
+import json
+import time
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from core.versions import bump_versions
 from recipes.models import Ingredient
 
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        for item in json.load(file):
+            yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
 
 class Command(BaseCommand):
-    help = 'Импорт ингредиентов из csv файла'
-
-    def handle(self, *args, **kwargs):
-        file = open('./ingredients.csv', encoding='utf-8')
-        reader = csv.reader(file)
-        for row in reader:
-            _, created = Ingredient.objects.get_or_create(
-                name=row[0],
-                measurement_unit=row[1]
+    help = 'Импорт ингредиентов из csv или json файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='ingredients.csv',
+                            help='Путь к файлу .csv или .json')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def read(self, path):
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(
+                f'Неподдерживаемый формат файла: {path.suffix}'
+            )
+        if not path.is_file():
+            raise CommandError(f'Файл не найден: {path}')
+        ingredients = {}
+        skipped = 0
+        for name, unit in reader(path):
+            name, unit = name.strip(), unit.strip()
+            if (not name or not unit or len(name) > NAME_MAX_LENGTH
+                    or len(unit) > UNIT_MAX_LENGTH):
+                skipped += 1
+                continue
+            ingredients.setdefault((name, unit), None)
+        return list(ingredients), skipped
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        path = Path(options['path'])
+        batch_size = options['batch_size']
+        ingredients, skipped = self.read(path)
+        self.stdout.write(
+            f'Прочитано уникальных ингредиентов: {len(ingredients)}, '
+            f'пропущено некорректных строк: {skipped}'
+        )
+        count_before = Ingredient.objects.count()
+        for start in range(0, len(ingredients), batch_size):
+            batch = ingredients[start:start + batch_size]
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in batch],
+                ignore_conflicts=True,
+            )
+            self.stdout.write(
+                f'Обработано {start + len(batch)} из {len(ingredients)}'
             )
-        print('done!')
+        created = Ingredient.objects.count() - count_before
+        if created:
+            bump_versions('ingredients')
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено {created} ингредиентов '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,51 @@
+import json
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.recipe_import import import_recipes
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Импорт рецептов из файла NDJSON, по рецепту в строке'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу или - для stdin')
+        parser.add_argument('--author', required=True,
+                            help='Email автора рецептов')
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.RECIPE_IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        author = User.objects.filter(email=options['author']).first()
+        if author is None:
+            raise CommandError(
+                f'Пользователь не найден: {options["author"]}'
+            )
+        if options['path'] == '-':
+            created, errors = import_recipes(
+                author, sys.stdin.buffer, options['batch_size']
+            )
+        else:
+            try:
+                # Строки декодирует read_lines, чтобы ошибка кодировки
+                # касалась одной строки, а не всего файла.
+                with open(options['path'], 'rb') as file:
+                    created, errors = import_recipes(
+                        author, file, options['batch_size']
+                    )
+            except FileNotFoundError:
+                raise CommandError(f'Файл не найден: {options["path"]}')
+        for error in errors:
+            self.stderr.write(
+                f'Строка {error["line"]}: '
+                f'{json.dumps(error["errors"], ensure_ascii=False)}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено {created} рецептов, строк с ошибками: '
+            f'{len(errors)}, за {time.monotonic() - started:.2f} с'
+        ))
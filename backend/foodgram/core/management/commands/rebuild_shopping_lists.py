@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт или проверка сводных списков покупок пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только проверить, ничего не меняя')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        user_ids = list(
+            User.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        batch_size = options['batch_size']
+        mismatched = set()
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            if options['check']:
+                mismatched |= ShoppingListItem.objects.mismatched_user_ids(
+                    batch
+                )
+            else:
+                ShoppingListItem.objects.rebuild(batch)
+        elapsed = time.monotonic() - started
+        if mismatched:
+            raise CommandError(
+                f'Расхождения у {len(mismatched)} пользователей: '
+                f'{sorted(mismatched)[:20]}'
+            )
+        action = 'проверены' if options['check'] else 'пересчитаны'
+        self.stdout.write(
+            f'Списки {len(user_ids)} пользователей {action} '
+            f'за {elapsed:.2f} с'
+        )
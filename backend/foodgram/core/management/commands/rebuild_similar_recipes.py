@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import similarity
+
+
+class Command(BaseCommand):
+    help = 'Полный пересчёт таблицы похожих рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Рецептов в одном умножении матриц')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = similarity.rebuild(options['batch_size'])
+        self.stdout.write(
+            f'Похожие рецепты для {total} рецептов пересчитаны '
+            f'за {time.monotonic() - started:.2f} с'
+        )
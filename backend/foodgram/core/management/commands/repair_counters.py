@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, Shoplist
+from users.models import User
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков избранного, корзин и рецептов автора'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            recipes = Recipe.objects.update(
+                favorites_count=count_of(Favorite, 'recipe'),
+                in_carts_count=count_of(Shoplist, 'recipe'),
+            )
+            users = User.objects.update(
+                recipes_count=count_of(Recipe, 'author')
+            )
+        self.stdout.write(
+            f'Пересчитаны счётчики {recipes} рецептов и {users} '
+            f'пользователей за {time.monotonic() - started:.2f} с'
+        )
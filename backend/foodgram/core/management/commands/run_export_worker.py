@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import exports
+
+
+class Command(BaseCommand):
+    help = 'Обработчик очереди выгрузок списков покупок в PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2,
+                            help='Процессов для отрисовки PDF')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Пауза между проверками очереди, секунд')
+        parser.add_argument('--cleanup-interval', type=float, default=60.0,
+                            help='Пауза между удалениями устаревших '
+                                 'файлов, секунд')
+        parser.add_argument('--once', action='store_true',
+                            help='Разобрать очередь и завершиться')
+
+    def handle(self, *args, **options):
+        processes = max(options['processes'], 1)
+        running = {}
+        cleaned_at = 0
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            while True:
+                close_old_connections()
+                if time.monotonic() - cleaned_at >= options[
+                    'cleanup_interval'
+                ]:
+                    exports.requeue_stale()
+                    exports.cleanup()
+                    cleaned_at = time.monotonic()
+                for job in exports.claim(processes - len(running)):
+                    running[pool.submit(exports.render, job.items)] = job
+                if not running:
+                    if options['once']:
+                        return
+                    time.sleep(options['interval'])
+                    continue
+                done, _ = wait(running, timeout=options['interval'],
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.complete(running.pop(future), future)
+
+    def complete(self, job, future):
+        try:
+            content = future.result()
+        except Exception as error:
+            exports.fail(job, error)
+            self.stderr.write(f'Выгрузка {job.pk}: ошибка {error!r}')
+            return
+        exports.finish(job, content)
+        self.stdout.write(f'Выгрузка {job.pk} готова')
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import similarity
+
+
+class Command(BaseCommand):
+    help = 'Обработчик очереди пересчёта похожих рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Рецептов в одном пересчёте')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Пауза между проверками очереди, секунд')
+        parser.add_argument('--once', action='store_true',
+                            help='Разобрать очередь и завершиться')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        while True:
+            close_old_connections()
+            started = time.monotonic()
+            count = similarity.refresh_queued(batch_size)
+            if count:
+                self.stdout.write(
+                    f'Похожие рецепты для {count} рецептов пересчитаны '
+                    f'за {time.monotonic() - started:.2f} с'
+                )
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,207 @@
+"""Метрики запросов к API в текстовом формате Prometheus.
+
+Метрики хранятся в памяти процесса, поэтому каждый воркер отдаёт свои.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from . import recipe_cache
+from .db_router import query_counts
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+LABELS = ('view', 'action', 'method')
+
+# Сборщик запросов к базе для текущего HTTP-запроса.
+current_request = ContextVar('metrics_request', default=None)
+
+_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, labels, value):
+        counts, total, count = self.values.get(
+            labels, ((0,) * len(self.buckets), 0, 0)
+        )
+        counts = tuple(
+            bucket_count + (value <= bound)
+            for bucket_count, bound in zip(counts, self.buckets)
+        )
+        self.values[labels] = (counts, total + value, count + 1)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield (f'{self.name}_bucket'
+                       f'{format_labels(labels, le=bound)} {bucket_count}')
+            yield (f'{self.name}_bucket'
+                   f'{format_labels(labels, le="+Inf")} {count}')
+            yield f'{self.name}_sum{format_labels(labels)} {total}'
+            yield f'{self.name}_count{format_labels(labels)} {count}'
+
+
+class CounterMetric:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.values = defaultdict(float)
+
+    def inc(self, labels, value=1):
+        self.values[labels] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self.values.items()):
+            yield f'{self.name}{format_labels(labels)} {value}'
+
+
+request_duration = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки запроса.', DURATION_BUCKETS,
+)
+request_queries = Histogram(
+    'foodgram_http_request_sql_queries',
+    'Число SQL-запросов на HTTP-запрос.', QUERY_BUCKETS,
+)
+response_size = Histogram(
+    'foodgram_http_response_size_bytes',
+    'Размер тела ответа.', SIZE_BUCKETS,
+)
+sql_seconds = CounterMetric(
+    'foodgram_http_request_sql_seconds_total',
+    'Суммарное время SQL-запросов.',
+)
+over_budget = CounterMetric(
+    'foodgram_http_requests_over_query_budget_total',
+    'Запросы, превысившие METRICS_QUERY_BUDGET.',
+)
+METRICS = (
+    request_duration, request_queries, response_size, sql_seconds,
+    over_budget,
+)
+
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_labels(values, **extra):
+    pairs = list(zip(LABELS, values)) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(f'{key}="{escape(value)}"'
+                             for key, value in pairs)
+
+
+IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+NUMBER = re.compile(r'\b\d+\b')
+
+
+def sql_shape(sql):
+    """SQL без конкретных значений: списки IN и числа схлопываются."""
+    return NUMBER.sub('N', IN_LIST.sub('(...)', sql))
+
+
+class RequestQueries:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+
+def collect_query(execute, sql, params, many, context):
+    collector = current_request.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        collector.count += 1
+        collector.duration += time.perf_counter() - start
+        collector.shapes[sql_shape(sql)] += 1
+
+
+def install_query_collector(connection, **kwargs):
+    if collect_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(collect_query)
+
+
+def get_labels(request):
+    match = request.resolver_match
+    if match is None:
+        return ('unresolved', '', request.method)
+    view = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None) or {}
+    name = view.__name__ if view is not None else match.view_name
+    return (name, actions.get(request.method.lower(), ''), request.method)
+
+
+def get_size(response):
+    if response.streaming:
+        return int(response.get('Content-Length') or 0)
+    return len(response.content)
+
+
+def record(request, response, duration, queries):
+    labels = get_labels(request)
+    with _lock:
+        request_duration.observe(labels, duration)
+        request_queries.observe(labels, queries.count)
+        response_size.observe(labels, get_size(response))
+        sql_seconds.inc(labels, queries.duration)
+        if queries.count > settings.METRICS_QUERY_BUDGET:
+            over_budget.inc(labels)
+    if queries.count > settings.METRICS_QUERY_BUDGET:
+        logger.warning(
+            '%s %s (%s.%s): %d SQL-запросов при бюджете %d, '
+            'чаще всего повторяются: %s',
+            request.method, request.path, labels[0], labels[1],
+            queries.count, settings.METRICS_QUERY_BUDGET,
+            '; '.join(f'{count} x {shape[:200]}' for shape, count
+                      in queries.shapes.most_common(3)),
+        )
+
+
+def render():
+    """Все метрики процесса в текстовом формате Prometheus."""
+    with _lock:
+        lines = [line for metric in METRICS for line in metric.render()]
+    lines += [
+        '# HELP foodgram_db_queries_total Запросы к базе по псевдонимам.',
+        '# TYPE foodgram_db_queries_total counter',
+    ]
+    lines += [
+        f'foodgram_db_queries_total{{alias="{escape(alias)}"}} {count}'
+        for alias, count in sorted(query_counts().items())
+    ]
+    cache_stats = recipe_cache.stats()
+    lines += [
+        '# HELP foodgram_recipe_list_cache_total Обращения к кэшу '
+        'списка рецептов.',
+        '# TYPE foodgram_recipe_list_cache_total counter',
+        f'foodgram_recipe_list_cache_total{{result="hit"}} '
+        f'{cache_stats["hits"]}',
+        f'foodgram_recipe_list_cache_total{{result="miss"}} '
+        f'{cache_stats["misses"]}',
+    ]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+from .db_router import choose_replica, read_alias
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def sticky_key(request):
+    """Ключ клиента для привязки к основной базе: токен или сессия."""
+    credentials = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    return sticky_key_for(credentials)
+
+
+def sticky_key_for(credentials):
+    digest = hashlib.md5(credentials.encode()).hexdigest()
+    return f'db:primary:{digest}'
+
+
+def choose_alias(request):
+    key = sticky_key(request)
+    if request.method not in SAFE_METHODS or (key and cache.get(key)):
+        return None
+    return choose_replica()
+
+
+def remember_write(request, response):
+    if request.method in SAFE_METHODS:
+        return
+    key = sticky_key(request)
+    session = response.cookies.get(settings.SESSION_COOKIE_NAME)
+    if session is not None and session.value:
+        key = sticky_key_for(session.value)
+    # Вход по токену: запрос без учётных данных, токен есть только в ответе.
+    data = getattr(response, 'data', None)
+    if isinstance(data, dict) and data.get('auth_token'):
+        key = sticky_key_for(f'Token {data["auth_token"]}')
+    if key:
+        cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+
+
+@sync_and_async_middleware
+def replica_middleware(get_response):
+    """Отправляет чтения безопасных запросов в реплику.
+
+    После запроса на запись клиент REPLICA_STICKY_SECONDS секунд читает
+    из основной базы и видит свои изменения, даже если реплика отстаёт.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            if sticky_key(request):
+                alias = await sync_to_async(
+                    choose_alias, thread_sensitive=False
+                )(request)
+            else:
+                alias = choose_alias(request)
+            token = read_alias.set(alias)
+            try:
+                response = await get_response(request)
+            finally:
+                read_alias.reset(token)
+            if request.method not in SAFE_METHODS:
+                await sync_to_async(
+                    remember_write, thread_sensitive=False
+                )(request, response)
+            return response
+    else:
+        def middleware(request):
+            token = read_alias.set(choose_alias(request))
+            try:
+                response = get_response(request)
+            finally:
+                read_alias.reset(token)
+            remember_write(request, response)
+            return response
+    return middleware
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Собирает метрики запроса: время, SQL-запросы и размер ответа."""
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            queries = metrics.RequestQueries()
+            token = metrics.current_request.set(queries)
+            start = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                metrics.current_request.reset(token)
+            metrics.record(
+                request, response, time.perf_counter() - start, queries
+            )
+            return response
+    else:
+        def middleware(request):
+            queries = metrics.RequestQueries()
+            token = metrics.current_request.set(queries)
+            start = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                metrics.current_request.reset(token)
+            metrics.record(
+                request, response, time.perf_counter() - start, queries
+            )
+            return response
+    return middleware
@@ -0,0 +1,17 @@
+from django.db import models
+
+
+class ChangeVersion(models.Model):
+    key = models.CharField(max_length=100, unique=True,
+                           verbose_name='Ключ')
+    version = models.PositiveBigIntegerField(default=0,
+                                             verbose_name='Версия')
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name='Изменено')
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.key}: {self.version}'
@@ -1,6 +1,57 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CustomCursorPagination(CursorPagination):
+    """Курсор по сортировке queryset.
+
+    Курсор DRF хранит значение только первого поля сортировки. Если оно
+    не уникально или меняется (число избранного, релевантность поиска),
+    курсор сводится к смещению, и строки пропускаются или повторяются,
+    поэтому первым полем должен быть первичный ключ.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(
+            queryset.query.order_by or queryset.model._meta.ordering
+        )
+        first = ordering[0] if ordering else None
+        if not isinstance(first, str) or first.lstrip('-') not in (
+            'pk', queryset.model._meta.pk.name
+        ):
+            raise ValidationError({self.cursor_query_param: [
+                'Курсор недоступен при такой сортировке, используйте page.'
+            ]})
+        return ordering
 
 
 class CustomPagination(PageNumberPagination):
+    """Пагинация по номеру страницы или, при параметре cursor, по курсору.
+
+    Курсорный режим не считает общее количество объектов и не использует
+    OFFSET, поэтому стоимость запроса не зависит от глубины прокрутки.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    cursor_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if CustomCursorPagination.cursor_query_param in request.query_params:
+            self.cursor_pagination = CustomCursorPagination()
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class ListPagination(PageNumberPagination):
+    """Постраничный вывод уже упорядоченного списка, без курсора."""
     page_size = 6
     page_size_query_param = 'limit'
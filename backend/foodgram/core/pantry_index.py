@@ -0,0 +1,145 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from recipes.models import Recipe, RecipeIngredient, RecipeTag
+from .models import ChangeVersion
+
+VERSION_KEYS = ('recipes', 'ingredients', 'tags')
+EMPTY = np.zeros(0, dtype=np.int32)
+
+
+def get_version():
+    versions = dict(ChangeVersion.objects.filter(
+        key__in=VERSION_KEYS
+    ).values_list('key', 'version'))
+    return tuple(versions.get(key, 0) for key in VERSION_KEYS)
+
+
+def group_positions(recipe_ids, pairs):
+    """Номера рецептов в recipe_ids для каждого признака из пар
+    (id признака, id рецепта), по возрастанию."""
+    positions = np.searchsorted(recipe_ids, pairs[:, 1])
+    # Пары рецептов, появившихся после загрузки списка рецептов.
+    known = positions < len(recipe_ids)
+    known[known] = recipe_ids[positions[known]] == pairs[known, 1]
+    keys, positions = pairs[known, 0], positions[known].astype(np.int32)
+    order = np.lexsort((positions, keys))
+    keys, positions = keys[order], positions[order]
+    unique, starts = np.unique(keys, return_index=True)
+    return positions, dict(zip(
+        unique.tolist(), np.split(positions, starts[1:])
+    ))
+
+
+class PantryState:
+    def __init__(self, version):
+        self.version = version
+        self.recipe_ids = np.array(
+            Recipe.objects.order_by('pk').values_list('pk', flat=True),
+            dtype=np.int64,
+        )
+        positions, self.ingredients = group_positions(
+            self.recipe_ids, self.load(RecipeIngredient, 'ingredient_id')
+        )
+        self.sizes = np.bincount(
+            positions, minlength=len(self.recipe_ids)
+        ).astype(np.int32)
+        _, self.tags = group_positions(
+            self.recipe_ids, self.load(RecipeTag, 'tag_id')
+        )
+
+    @staticmethod
+    def load(model, field):
+        return np.array(
+            list(model.objects.order_by().values_list(field, 'recipe_id')),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+
+
+class PantryIndex:
+    """Инвертированный индекс ингредиент -> рецепты в памяти процесса.
+
+    Для каждого ингредиента и тега хранится массив номеров рецептов, в
+    которых он есть. Индекс перестраивается, когда меняются версии
+    рецептов, ингредиентов или тегов, проверка - не чаще раза в
+    REFERENCE_DATA_CHECK_INTERVAL секунд. Индекс перестраивается в
+    фоновом потоке, а запросы до конца перестройки отвечают по
+    предыдущему; ждать приходится только первой сборки в процессе.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+        self._checked_at = 0
+
+    def get(self):
+        state = self._state
+        if state is not None and (
+            time.monotonic() - self._checked_at
+            < settings.REFERENCE_DATA_CHECK_INTERVAL
+        ):
+            return state
+        version = get_version()
+        if state is not None and state.version == version:
+            self._checked_at = time.monotonic()
+            return state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    self._state = PantryState(version)
+                    self._checked_at = time.monotonic()
+                return self._state
+        if self._lock.acquire(blocking=False):
+            self._checked_at = time.monotonic()
+            threading.Thread(
+                target=self._rebuild, args=(version,), daemon=True
+            ).start()
+        return state
+
+    def _rebuild(self, version):
+        try:
+            self._state = PantryState(version)
+            self._checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+            connection.close()
+
+    def search(self, ingredient_ids, max_missing=None, tag_ids=None):
+        """Рецепты, в которых есть хотя бы один из ингредиентов.
+
+        Сначала идут рецепты с наибольшей долей имеющихся ингредиентов,
+        затем с меньшим числом недостающих, затем с большим числом
+        имеющихся, затем более новые.
+        max_missing ограничивает число недостающих ингредиентов, tag_ids -
+        теги, хотя бы один из которых должен быть у рецепта. Возвращает
+        массивы id рецептов, числа имеющихся и недостающих ингредиентов.
+        """
+        state = self.get()
+        counts = np.zeros(len(state.recipe_ids), dtype=np.int32)
+        for pk in set(ingredient_ids):
+            counts[state.ingredients.get(pk, EMPTY)] += 1
+        missing = state.sizes - counts
+        found = counts > 0
+        if max_missing is not None:
+            found &= missing <= max_missing
+        if tag_ids is not None:
+            tagged = np.zeros(len(state.recipe_ids), dtype=bool)
+            for pk in tag_ids:
+                tagged[state.tags.get(pk, EMPTY)] = True
+            found &= tagged
+        found = np.flatnonzero(found)
+        order = np.lexsort((
+            -state.recipe_ids[found],
+            -counts[found],
+            missing[found],
+            -counts[found] / state.sizes[found],
+        ))
+        found = found[order]
+        return state.recipe_ids[found], counts[found], missing[found]
+
+
+pantry_index = PantryIndex()
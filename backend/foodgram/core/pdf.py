@@ -0,0 +1,76 @@
+import io
+from functools import lru_cache
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+FONT_NAME = 'FreeSans'
+FONT_SIZE = 12
+TITLE = 'СПИСОК ПОКУПОК:'
+TITLE_Y = 750
+HEADER_Y = 730
+FIRST_ROW_Y = 700
+LAST_ROW_Y = 100
+ROW_HEIGHT = 20
+ROWS_PER_PAGE = (FIRST_ROW_Y - LAST_ROW_Y) // ROW_HEIGHT + 1
+# Заголовок, ключ строки, левый край и ширина колонки.
+COLUMNS = (
+    ('Название:', 'name', 100, 290),
+    ('Кол-во:', 'amount', 400, 90),
+    ('Ед. изм.:', 'unit', 500, 80),
+)
+ELLIPSIS = '…'
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Регистрирует шрифт один раз на процесс."""
+    pdfmetrics.registerFont(
+        TTFont(FONT_NAME, str(settings.BASE_DIR / 'FreeSans.ttf'))
+    )
+    return FONT_NAME
+
+
+def fit_text(text, width):
+    """Обрезает строку, чтобы она не вылезала за границы колонки."""
+    if pdfmetrics.stringWidth(text, FONT_NAME, FONT_SIZE) <= width:
+        return text
+    while text and pdfmetrics.stringWidth(
+        text + ELLIPSIS, FONT_NAME, FONT_SIZE
+    ) > width:
+        text = text[:-1]
+    return text + ELLIPSIS
+
+
+def draw_page(pdf, rows):
+    pdf.setFont(FONT_NAME, FONT_SIZE)
+    pdf.drawCentredString(A4[0] / 2, TITLE_Y, TITLE)
+    for header, _, x, _ in COLUMNS:
+        pdf.drawString(x, HEADER_Y, header)
+    for _, key, x, width in COLUMNS:
+        column = pdf.beginText(x, FIRST_ROW_Y)
+        column.setFont(FONT_NAME, FONT_SIZE, leading=ROW_HEIGHT)
+        for row in rows:
+            column.textLine(fit_text(str(row[key]), width))
+        pdf.drawText(column)
+    pdf.showPage()
+
+
+def render_shopping_list(items):
+    """Формирует PDF со списком покупок.
+
+    items - последовательность словарей с ключами name, amount и unit.
+    Возвращает буфер, установленный на начало документа.
+    """
+    register_font()
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+    items = list(items)
+    for start in range(0, max(len(items), 1), ROWS_PER_PAGE):
+        draw_page(pdf, items[start:start + ROWS_PER_PAGE])
+    pdf.save()
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,107 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import Recipe, Tag
+
+PREFIX = 'recipe_list'
+HITS_KEY = f'{PREFIX}:hits'
+MISSES_KEY = f'{PREFIX}:misses'
+# Область, от которой зависят все страницы: теги, ингредиенты и авторы.
+REFERENCE = 'reference'
+# Область страниц без фильтров по автору и тегам.
+UNFILTERED = 'unfiltered'
+
+
+def generation_key(scope):
+    return f'{PREFIX}:gen:{scope}'
+
+
+def get_generations(scopes):
+    keys = [generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time.time_ns(), timeout=None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def bump_generations(*scopes):
+    """Сбрасывает кэш страниц областей после фиксации транзакции."""
+    def bump():
+        for scope in scopes:
+            key = generation_key(scope)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), timeout=None)
+    transaction.on_commit(bump)
+
+
+def invalidate_recipe(recipe_id, tag_ids=(), author_id=None):
+    """Сбрасывает страницы, на которых рецепт есть или может появиться."""
+    scopes = {UNFILTERED}
+    if author_id is None:
+        author_id = Recipe.objects.filter(pk=recipe_id).values_list(
+            'author_id', flat=True
+        ).first()
+    if author_id is not None:
+        scopes.add(f'author:{author_id}')
+    slugs = Tag.objects.filter(
+        Q(recipe=recipe_id) | Q(pk__in=tag_ids)
+    ).values_list('slug', flat=True).distinct()
+    scopes.update(f'tag:{slug}' for slug in slugs)
+    bump_generations(*scopes)
+
+
+def get_cache_key(request):
+    """Ключ страницы списка рецептов для анонимного пользователя.
+
+    Ключ включает нормализованные параметры запроса и поколения областей,
+    от которых зависит страница: автора, тегов или всего списка.
+    """
+    params = request.GET
+    author = params.get('author')
+    tags = sorted(set(params.getlist('tags')))
+    scopes = [REFERENCE]
+    if author:
+        scopes.append(f'author:{author}')
+    scopes.extend(f'tag:{slug}' for slug in tags)
+    if not author and not tags:
+        scopes.append(UNFILTERED)
+    normalized = repr((
+        request.get_host(),
+        sorted((key, sorted(params.getlist(key))) for key in params),
+        get_generations(scopes),
+    ))
+    return f'{PREFIX}:{hashlib.md5(normalized.encode()).hexdigest()}'
+
+
+def get_page(key, count_miss=True):
+    data = cache.get(key)
+    if data is None and not count_miss:
+        return None
+    counter = MISSES_KEY if data is None else HITS_KEY
+    if not cache.add(counter, 1, timeout=None):
+        try:
+            cache.incr(counter)
+        except ValueError:
+            cache.set(counter, 1, timeout=None)
+    return data
+
+
+def set_page(key, data):
+    cache.set(key, data, settings.RECIPE_LIST_CACHE_TIMEOUT)
+
+
+def stats():
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {
+        'hits': counters.get(HITS_KEY, 0),
+        'misses': counters.get(MISSES_KEY, 0),
+    }
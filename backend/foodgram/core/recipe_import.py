@@ -0,0 +1,136 @@
+import json
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+
+from core import recipe_cache, search, similarity
+from core.versions import bump_versions
+from recipes.api.serializers import RecipeCreateUpdateSerializer
+from recipes.models import Recipe, RecipeIngredient, RecipeTag
+from users.models import User
+
+
+def read_lines(lines):
+    """Разбирает строки NDJSON.
+
+    Для каждой непустой строки возвращает её номер, объект и ошибку
+    разбора.
+    """
+    for number, line in enumerate(lines, 1):
+        try:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+        except UnicodeDecodeError as error:
+            yield number, None, {
+                'non_field_errors': [f'Строка не в кодировке UTF-8: {error}']
+            }
+        except ValueError as error:
+            yield number, None, {
+                'non_field_errors': [f'Неверный JSON: {error}']
+            }
+        else:
+            yield number, data, None
+
+
+def validate(data):
+    if not isinstance(data, dict):
+        return None, {'non_field_errors': ['Ожидается объект рецепта.']}
+    serializer = RecipeCreateUpdateSerializer(data=data)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    return serializer.validated_data, None
+
+
+def insert_recipes(author, items):
+    """Сохраняет проверенные рецепты одной пачкой.
+
+    bulk_create не отправляет сигналы, поэтому счётчик рецептов автора,
+    поисковый индекс, версия, кэш списков и похожие рецепты обновляются
+    здесь же.
+    """
+    recipes = []
+    for data in items:
+        data = dict(data)
+        data.pop('recipeingredient_set')
+        data.pop('tags')
+        recipes.append(Recipe(author=author, **data))
+    connection = connections[Recipe.objects.db]
+    bulk = connection.features.can_return_rows_from_bulk_insert
+    if bulk:
+        Recipe.objects.bulk_create(recipes)
+    else:
+        # Без RETURNING id новых строк не узнать, поэтому рецепты
+        # сохраняются по одному, а сигналы делают остальную работу.
+        for recipe in recipes:
+            recipe.save()
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient=item['ingredient']['id'],
+            amount=item['amount'],
+        )
+        for recipe, data in zip(recipes, items)
+        for item in data['recipeingredient_set']
+    ])
+    scopes = {recipe_cache.UNFILTERED, f'author:{author.pk}'}
+    recipe_tags = []
+    for recipe, data in zip(recipes, items):
+        for tag in set(data['tags']):
+            scopes.add(f'tag:{tag.slug}')
+            recipe_tags.append(RecipeTag(recipe=recipe, tag=tag))
+    RecipeTag.objects.bulk_create(recipe_tags)
+    if bulk:
+        User.objects.filter(pk=author.pk).update(
+            recipes_count=F('recipes_count') + len(recipes)
+        )
+        search.update_index([recipe.pk for recipe in recipes])
+    bump_versions('recipes', 'users')
+    recipe_cache.bump_generations(*scopes)
+    similarity.mark_changed(recipe.pk for recipe in recipes)
+    return recipes
+
+
+def import_recipes(author, lines, batch_size=500):
+    """Импортирует рецепты из строк NDJSON пачками по batch_size.
+
+    Строки с ошибками пропускаются и не мешают остальным. Возвращает
+    число созданных рецептов и список ошибок вида
+    {'line': номер строки, 'errors': ошибки сериализатора}.
+    """
+    created = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal created
+        if not batch:
+            return
+        try:
+            with transaction.atomic():
+                insert_recipes(author, [data for _, data in batch])
+        except DatabaseError as error:
+            errors.extend(
+                {'line': number, 'errors': {
+                    'non_field_errors': [f'Ошибка базы данных: {error}']
+                }}
+                for number, _ in batch
+            )
+        else:
+            created += len(batch)
+        batch.clear()
+
+    for number, data, error in read_lines(lines):
+        if error is None:
+            data, error = validate(data)
+        if error is not None:
+            errors.append({'line': number, 'errors': error})
+            continue
+        batch.append((number, data))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return created, errors
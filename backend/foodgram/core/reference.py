@@ -0,0 +1,112 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from recipes.models import Ingredient, Tag
+from .models import ChangeVersion
+from .versions import build_validators
+
+
+class Snapshot:
+    def __init__(self, version, updated_at, objects, fields):
+        self.version = version
+        self.updated_at = updated_at
+        self.objects = objects
+        self.by_pk = {obj.pk: obj for obj in objects}
+        self.payload = [
+            {field: getattr(obj, field) for field in fields}
+            for obj in objects
+        ]
+        self.payload_by_pk = {
+            item['id']: item for item in self.payload
+        }
+
+
+class ReferenceRegistry:
+    """Справочник, загруженный в память процесса.
+
+    Хранит объекты модели и готовые ответы API для них. Данные
+    перезагружаются, когда меняется версия ключа в ChangeVersion: после
+    правки в этом процессе - сразу, в остальных процессах - при следующей
+    проверке версии, не чаще раза в REFERENCE_DATA_CHECK_INTERVAL секунд.
+    """
+
+    def __init__(self, key, model, fields, ordering=None):
+        self.key = key
+        self.model = model
+        self.fields = fields
+        self.ordering = ordering or model._meta.ordering or ('pk',)
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0
+
+    def __deepcopy__(self, memo):
+        # Поля сериализаторов копируются вместе с аргументами, а справочник
+        # должен оставаться общим для процесса.
+        return self
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def invalidate_on_commit(self):
+        transaction.on_commit(self.invalidate)
+
+    def get_version(self):
+        return ChangeVersion.objects.filter(key=self.key).values_list(
+            'version', 'updated_at'
+        ).first() or (0, None)
+
+    def get_fresh(self):
+        """Снимок без обращения к базе или None, если пора проверить
+        версию. Подходит для асинхронного кода."""
+        snapshot = self._snapshot
+        if snapshot is not None and (
+            time.monotonic() - self._checked_at
+            < settings.REFERENCE_DATA_CHECK_INTERVAL
+        ):
+            return snapshot
+        return None
+
+    def get(self):
+        snapshot = self.get_fresh()
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            version, updated_at = self.get_version()
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = Snapshot(
+                    version,
+                    updated_at,
+                    list(self.model.objects.order_by(*self.ordering)),
+                    self.fields,
+                )
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def resolve(self, pks):
+        """Находит объекты по набору id.
+
+        Всё, чего нет в снимке, ищется одним запросом к базе: объект
+        мог появиться в другом процессе до очередной проверки версии.
+        """
+        by_pk = self.get().by_pk
+        found = {pk: by_pk[pk] for pk in pks if pk in by_pk}
+        missing = [pk for pk in pks if pk not in found]
+        if missing:
+            found.update(self.model.objects.in_bulk(missing))
+        return found
+
+    def get_validators(self, snapshot):
+        """ETag и время изменения снимка, те же, что у get_validators
+        по ключу справочника."""
+        return build_validators(
+            {self.key: (snapshot.version, snapshot.updated_at)}, [self.key]
+        )
+
+
+tags = ReferenceRegistry('tags', Tag, ('id', 'name', 'color', 'slug'))
+ingredients = ReferenceRegistry(
+    'ingredients', Ingredient, ('id', 'name', 'measurement_unit')
+)
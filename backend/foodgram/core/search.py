@@ -0,0 +1,98 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from recipes.models import Recipe
+
+TABLE = Recipe._meta.db_table
+FTS_TABLE = f'{TABLE}_fts'
+CONFIG = 'russian'
+# Вес совпадения в названии и в описании для bm25 в SQLite.
+FTS_WEIGHTS = (10.0, 1.0)
+
+
+def normalize(text):
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def fts_column(column):
+    return f"replace(replace(coalesce({column}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+def to_fts_query(query):
+    """Превращает пользовательский ввод в запрос FTS5: все слова
+    обязательны, каждое ищется по префиксу."""
+    return ' '.join(
+        f'"{word}"*'
+        for word in re.findall(r'\w+', normalize(query.lower()))
+    )
+
+
+def filter_recipes(queryset, query):
+    """Оставляет рецепты, подходящие под запрос, сначала самые
+    релевантные.
+
+    В PostgreSQL поиск идёт по вычисляемой колонке search_vector с
+    GIN-индексом, в SQLite - по таблице FTS5 recipes_recipe_fts.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        query = normalize(query)
+        tsquery = f"websearch_to_tsquery('{CONFIG}', %s)"
+        match = RawSQL(
+            f'{TABLE}.search_vector @@ {tsquery}', [query],
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            f'ts_rank({TABLE}.search_vector, {tsquery})', [query],
+            output_field=FloatField(),
+        )
+        queryset = queryset.filter(match)
+    elif vendor == 'sqlite':
+        query = to_fts_query(query)
+        if not query:
+            return queryset.none()
+        match = RawSQL(
+            f'{TABLE}.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)', [query],
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS[0]}, {FTS_WEIGHTS[1]}) '
+            f'FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {TABLE}.id', [query],
+            output_field=FloatField(),
+        )
+        queryset = queryset.filter(match)
+    else:
+        rank = Value(0, output_field=FloatField())
+        queryset = queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        )
+    return queryset.annotate(search_rank=rank).order_by('-search_rank', '-id')
+
+
+def update_index(recipe_ids):
+    """Обновляет поисковый индекс рецептов.
+
+    В PostgreSQL вектор вычисляется самой базой, в SQLite таблица FTS5
+    обновляется здесь: после сохранения, удаления и массовой загрузки.
+    """
+    connection = connections[Recipe.objects.db]
+    if connection.vendor != 'sqlite' or not recipe_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids,
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            f"SELECT id, {fts_column('name')}, {fts_column('text')} "
+            f'FROM {TABLE} '
+            f'WHERE id IN ({placeholders})',
+            recipe_ids,
+        )
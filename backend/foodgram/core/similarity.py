@@ -0,0 +1,298 @@
+"""Похожие рецепты по общим ингредиентам и тегам.
+
+Рецепт - разреженный вектор признаков: ингредиенты и теги с весами IDF,
+теги с коэффициентом SIMILAR_RECIPES_TAG_WEIGHT. Сходство - косинус
+между векторами. Ближайшие рецепты считаются заранее и хранятся в
+RecipeNeighbors: целиком командой rebuild_similar_recipes и точечно
+после изменения рецепта. Изменённые рецепты попадают в очередь
+RecipeNeighborsQueue, которую разбирает run_similar_recipes_worker, так
+что запрос на запись платит за пересчёт одной вставкой.
+
+Признаки, которые есть больше чем у SIMILAR_RECIPES_MAX_SHARE рецептов
+(соль, сахар, популярные теги), входят в оценку, но не в поиск
+кандидатов: иначе кандидатом оказалась бы почти каждая пара рецептов.
+Поэтому рецепт только из таких признаков похожих не получает.
+"""
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from scipy import sparse
+
+from recipes.models import (Recipe, RecipeIngredient, RecipeNeighbors,
+                            RecipeNeighborsQueue, RecipeTag)
+
+# Кандидатов на рецепт при полном пересчёте, во столько раз больше
+# хранимых соседей: отбор по редким признакам, окончательная оценка по
+# всем.
+CANDIDATES_FACTOR = 3
+
+Block = namedtuple('Block', 'model field weight')
+
+
+def get_blocks():
+    return (
+        Block(RecipeIngredient, 'ingredient_id', 1.0),
+        Block(RecipeTag, 'tag_id', settings.SIMILAR_RECIPES_TAG_WEIGHT),
+    )
+
+
+def load_pairs(block, recipes=None):
+    """Пары (id рецепта, id признака) для всех рецептов или для
+    подзапроса recipes."""
+    queryset = block.model.objects.order_by()
+    if recipes is not None:
+        queryset = queryset.filter(recipe_id__in=recipes)
+    pairs = np.array(
+        list(queryset.values_list('recipe_id', block.field)), dtype=np.int64
+    ).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def count_recipes(block, feature_ids):
+    """Число рецептов с каждым из признаков feature_ids."""
+    counts = dict(
+        block.model.objects.order_by()
+        .filter(**{f'{block.field}__in': feature_ids.tolist()})
+        .values(block.field)
+        .annotate(total=Count('pk'))
+        .values_list(block.field, 'total')
+    )
+    return np.array([counts.get(pk, 0) for pk in feature_ids.tolist()],
+                    dtype=np.int64)
+
+
+def build_vectors(recipe_ids, blocks, total, complete):
+    """Векторы рецептов recipe_ids (по возрастанию) единичной длины.
+
+    blocks - пары (Block, (id рецептов, id признаков)). Если complete,
+    пары загружены для всех рецептов и частоты признаков считаются по
+    ним, иначе запрашиваются у базы. Возвращает матрицу и маску частых
+    признаков.
+    """
+    matrices = []
+    frequent = []
+    for block, (rows, cols) in blocks:
+        features, columns = np.unique(cols, return_inverse=True)
+        if complete:
+            counts = np.bincount(columns, minlength=len(features))
+        else:
+            counts = count_recipes(block, features)
+        idf = np.log((1 + total) / (1 + counts)) + 1
+        matrices.append(sparse.csr_matrix(
+            ((idf[columns] * block.weight).astype(np.float32),
+             (np.searchsorted(recipe_ids, rows), columns)),
+            shape=(len(recipe_ids), len(features)),
+        ))
+        frequent.append(counts > settings.SIMILAR_RECIPES_MAX_SHARE * total)
+    matrix = sparse.hstack(matrices, format='csr')
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags(1 / norms).dot(matrix).tocsr(),
+            np.concatenate(frequent))
+
+
+def top_entries(matrix, count, exclude):
+    """До count столбцов с наибольшими значениями для каждой строки CSR,
+    кроме столбца exclude[строка]."""
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        columns = matrix.indices[start:end]
+        values = matrix.data[start:end]
+        keep = (columns != exclude[row]) & (values > 0)
+        columns, values = columns[keep], values[keep]
+        if len(values) > count:
+            best = np.argpartition(-values, count)[:count]
+            columns, values = columns[best], values[best]
+        order = np.argsort(-values, kind='stable')
+        yield columns[order], values[order]
+
+
+def to_neighbors(recipe_ids, columns, values):
+    scores = np.round(values.astype(np.float64), 4)
+    return [list(pair) for pair in zip(recipe_ids[columns].tolist(),
+                                       scores.tolist())]
+
+
+def rebuild(batch_size=2000):
+    """Пересчитывает соседей всех рецептов. Возвращает число рецептов."""
+    # Правки, сделанные до начала пересчёта, он учтёт сам.
+    RecipeNeighborsQueue.objects.all().delete()
+    recipe_ids = np.array(
+        Recipe.objects.order_by('pk').values_list('pk', flat=True),
+        dtype=np.int64,
+    )
+    total = len(recipe_ids)
+    stored = settings.SIMILAR_RECIPES_STORED
+    objects = []
+    if total:
+        matrix, frequent = build_vectors(
+            recipe_ids,
+            [(block, load_pairs(block)) for block in get_blocks()],
+            total, complete=True,
+        )
+        rare = matrix[:, np.flatnonzero(~frequent)].tocsr()
+        rare_transposed = rare.T.tocsr()
+    for start in range(0, total, batch_size):
+        stop = min(start + batch_size, total)
+        candidates = rare[start:stop].dot(rare_transposed).tocsr()
+        rows = []
+        columns = []
+        for row, (found, _) in zip(
+            range(start, stop),
+            top_entries(candidates, stored * CANDIDATES_FACTOR,
+                        np.arange(start, stop)),
+        ):
+            rows.append(np.full(len(found), row))
+            columns.append(found)
+        rows = np.concatenate(rows)
+        columns = np.concatenate(columns)
+        scores = np.asarray(
+            matrix[rows].multiply(matrix[columns]).sum(axis=1)
+        ).ravel()
+        bounds = np.searchsorted(rows, np.arange(start, stop + 1))
+        for row in range(start, stop):
+            found = slice(bounds[row - start], bounds[row - start + 1])
+            order = np.argsort(-scores[found], kind='stable')[:stored]
+            objects.append(RecipeNeighbors(
+                recipe_id=int(recipe_ids[row]),
+                neighbors=to_neighbors(recipe_ids, columns[found][order],
+                                       scores[found][order]),
+            ))
+    with transaction.atomic():
+        RecipeNeighbors.objects.all().delete()
+        RecipeNeighbors.objects.bulk_create(objects, batch_size=1000)
+    return total
+
+
+def score_recipes(recipe_ids):
+    """Сходство рецептов recipe_ids с их кандидатами без полного
+    пересчёта.
+
+    Кандидаты - рецепты с общими редкими признаками. Возвращает id
+    рецептов, id кандидатов и матрицу сходства между ними.
+    """
+    total = Recipe.objects.count()
+    changed = np.array(sorted(
+        Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', flat=True)
+    ), dtype=np.int64)
+    if not len(changed):
+        return changed, changed, None
+    shared = Q(pk__in=changed.tolist())
+    for block in get_blocks():
+        _, features = load_pairs(block, changed.tolist())
+        features = np.unique(features)
+        rare = features[count_recipes(block, features)
+                        <= settings.SIMILAR_RECIPES_MAX_SHARE * total]
+        shared |= Q(pk__in=block.model.objects.filter(
+            **{f'{block.field}__in': rare.tolist()}
+        ).values('recipe_id'))
+    candidates = Recipe.objects.filter(shared).values('pk')
+    candidate_ids = np.array(sorted(
+        candidates.values_list('pk', flat=True)
+    ), dtype=np.int64)
+    matrix, _ = build_vectors(
+        candidate_ids,
+        [(block, load_pairs(block, candidates)) for block in get_blocks()],
+        total, complete=False,
+    )
+    rows = np.searchsorted(candidate_ids, changed)
+    return changed, candidate_ids, matrix[rows].dot(matrix.T).tocsr()
+
+
+def get_neighbors(recipe_id):
+    """Соседи рецепта из таблицы, а если их ещё не считали - на лету."""
+    neighbors = RecipeNeighbors.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('neighbors', flat=True).first()
+    if neighbors is not None:
+        return neighbors
+    changed, candidate_ids, scores = score_recipes([recipe_id])
+    if scores is None:
+        return []
+    columns, values = next(top_entries(
+        scores, settings.SIMILAR_RECIPES_STORED,
+        np.searchsorted(candidate_ids, changed),
+    ))
+    return to_neighbors(candidate_ids, columns, values)
+
+
+def merge(neighbors, recipe_id, score):
+    """Список соседей с recipe_id на месте, которое даёт score."""
+    neighbors = [item for item in neighbors if item[0] != recipe_id]
+    if score > 0:
+        neighbors.append([recipe_id, round(float(score), 4)])
+        neighbors.sort(key=lambda item: -item[1])
+    return neighbors[:settings.SIMILAR_RECIPES_STORED]
+
+
+def refresh(recipe_ids):
+    """Пересчитывает соседей изменённых рецептов и обновляет их место в
+    списках ближайших к ним рецептов.
+
+    Рецепт, который после правки перестал быть похожим на рецепты за
+    пределами его кандидатов, остаётся в их списках до полного
+    пересчёта.
+    """
+    changed, candidate_ids, scores = score_recipes(recipe_ids)
+    if scores is None:
+        return
+    stored = settings.SIMILAR_RECIPES_STORED
+    own = {}
+    reverse = {}
+    for recipe_id, (columns, values) in zip(changed.tolist(), top_entries(
+        scores, stored * CANDIDATES_FACTOR,
+        np.searchsorted(candidate_ids, changed),
+    )):
+        own[recipe_id] = to_neighbors(candidate_ids, columns[:stored],
+                                      values[:stored])
+        for pk, score in to_neighbors(candidate_ids, columns, values):
+            reverse.setdefault(pk, []).append((recipe_id, score))
+    for pk in own:
+        reverse.pop(pk, None)
+    with transaction.atomic():
+        RecipeNeighbors.objects.filter(recipe_id__in=list(own)).delete()
+        RecipeNeighbors.objects.bulk_create([
+            RecipeNeighbors(recipe_id=pk, neighbors=neighbors)
+            for pk, neighbors in own.items()
+        ])
+        updated = []
+        for row in RecipeNeighbors.objects.select_for_update().filter(
+            recipe_id__in=list(reverse)
+        ):
+            neighbors = row.neighbors
+            for recipe_id, score in reverse[row.recipe_id]:
+                neighbors = merge(neighbors, recipe_id, score)
+            if neighbors != row.neighbors:
+                row.neighbors = neighbors
+                updated.append(row)
+        RecipeNeighbors.objects.bulk_update(updated, ['neighbors'],
+                                            batch_size=500)
+
+
+def mark_changed(recipe_ids):
+    """Ставит рецепты в очередь на пересчёт соседей одним запросом."""
+    RecipeNeighborsQueue.objects.bulk_create(
+        [RecipeNeighborsQueue(recipe_id=pk) for pk in set(recipe_ids)],
+        ignore_conflicts=True,
+    )
+
+
+def refresh_queued(limit):
+    """Пересчитывает соседей до limit рецептов из очереди.
+
+    Рецепт уходит из очереди в той же транзакции, что и пересчёт: если
+    его изменят снова, пока транзакция не завершена, он вернётся в
+    очередь. Возвращает число пересчитанных рецептов.
+    """
+    with transaction.atomic():
+        recipe_ids = list(
+            RecipeNeighborsQueue.objects.select_for_update(skip_locked=True)
+            .order_by('pk').values_list('pk', flat=True)[:limit]
+        )
+        if recipe_ids:
+            RecipeNeighborsQueue.objects.filter(pk__in=recipe_ids).delete()
+            refresh(recipe_ids)
+    return len(recipe_ids)
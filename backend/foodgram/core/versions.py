@@ -0,0 +1,86 @@
+import hashlib
+from functools import wraps
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import ChangeVersion
+
+
+def bump_versions(*keys):
+    """Увеличивает версии ключей после фиксации текущей транзакции."""
+    def bump():
+        now = timezone.now()
+        for key in keys:
+            updated = ChangeVersion.objects.filter(key=key).update(
+                version=F('version') + 1, updated_at=now
+            )
+            if updated:
+                continue
+            _, created = ChangeVersion.objects.get_or_create(
+                key=key, defaults={'version': 1}
+            )
+            if not created:
+                ChangeVersion.objects.filter(key=key).update(
+                    version=F('version') + 1, updated_at=now
+                )
+    transaction.on_commit(bump)
+
+
+def get_validators(keys, extra=(), modified=None):
+    """Возвращает ETag и время изменения для набора ключей версий.
+
+    extra - дополнительные значения, от которых зависит ответ (например,
+    id пользователя), modified - собственное время изменения объекта.
+    """
+    versions = {
+        key: (version, updated_at)
+        for key, version, updated_at in ChangeVersion.objects.filter(
+            key__in=keys
+        ).values_list('key', 'version', 'updated_at')
+    }
+    return build_validators(versions, keys, extra, modified)
+
+
+def build_validators(versions, keys, extra=(), modified=None):
+    """Считает валидаторы по уже известным версиям {ключ: (версия, время)}."""
+    parts = [str(versions.get(key, (0, None))[0]) for key in keys]
+    parts.extend(str(value) for value in extra)
+    etag = quote_etag(hashlib.md5(':'.join(parts).encode()).hexdigest())
+    dates = [
+        updated_at for _, updated_at in versions.values()
+        if updated_at is not None
+    ]
+    if modified is not None:
+        dates.append(modified)
+    last_modified = int(max(dates).timestamp()) if dates else None
+    return etag, last_modified
+
+
+def conditional(method):
+    """Отвечает 304 Not Modified, если у клиента актуальная версия ответа.
+
+    Валидаторы берутся из view.get_validators(request, *args, **kwargs),
+    который может вернуть (None, None), чтобы обработать запрос как обычно.
+    """
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        etag, last_modified = view.get_validators(request, *args, **kwargs)
+        if etag is None and last_modified is None:
+            return method(view, request, *args, **kwargs)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = method(view, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        if etag is not None:
+            response.setdefault('ETag', etag)
+        if last_modified is not None:
+            response.setdefault('Last-Modified', http_date(last_modified))
+        return response
+    return wrapper
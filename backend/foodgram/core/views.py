@@ -0,0 +1,16 @@
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+from . import metrics
+
+
+class MetricsView(APIView):
+    """Метрики процесса для Prometheus, доступны только персоналу."""
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
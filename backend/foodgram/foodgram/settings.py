@@ -1,5 +1,6 @@
 import os
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -30,11 +31,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.replica_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,6 +74,48 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения через запятую: хосты PostgreSQL или, для локальной
+# проверки на SQLite, имена файлов баз.
+DATABASE_REPLICAS = []
+for number, location in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        TEST={'MIRROR': 'default'},
+    )
+    if DATABASES[alias]['ENGINE'].endswith('sqlite3'):
+        DATABASES[alias]['NAME'] = location.strip()
+    else:
+        DATABASES[alias]['HOST'] = location.strip()
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=10))
+
+# Асинхронные view для частых запросов на чтение, включаются в asgi.py.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', default='') == '1'
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+# Привязка клиента к основной базе после записи хранится в кэше, и её
+# должны видеть все процессы, иначе следующий запрос уйдёт в реплику.
+if DATABASE_REPLICAS and CACHES['default']['BACKEND'].rsplit('.', 1)[-1] in (
+    'LocMemCache', 'DummyCache'
+):
+    raise ImproperlyConfigured(
+        'С DB_REPLICAS нужен общий для всех процессов CACHE_BACKEND, '
+        'например django.core.cache.backends.db.DatabaseCache.'
+    )
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -132,3 +177,25 @@ DJOSER = {
         'current_user': 'users.api.serializers.UserDetailSerializer',
     }
 }
+
+INGREDIENT_SEARCH_LIMIT = 50
+REFERENCE_DATA_CHECK_INTERVAL = 5
+RECIPE_LIST_CACHE_TIMEOUT = 600
+RECIPE_IMPORT_BATCH_SIZE = 500
+RECIPE_IMPORT_MAX_LINES = 10000
+# Похожие рецепты: сколько отдавать по умолчанию и сколько хранить,
+# вес тегов относительно ингредиентов и доля рецептов, начиная с которой
+# признак считается слишком частым для поиска кандидатов.
+SIMILAR_RECIPES_LIMIT = 10
+SIMILAR_RECIPES_STORED = 20
+SIMILAR_RECIPES_TAG_WEIGHT = 0.5
+SIMILAR_RECIPES_MAX_SHARE = 0.05
+PANTRY_MAX_INGREDIENTS = 100
+# Фоновая выгрузка списков покупок в PDF: готовые файлы хранятся
+# SHOPPING_LIST_EXPORT_TTL секунд, задача дольше
+# SHOPPING_LIST_EXPORT_TIMEOUT секунд возвращается в очередь.
+SHOPPING_LIST_EXPORT_TTL = 3600
+SHOPPING_LIST_EXPORT_TIMEOUT = 600
+
+# Запросы с большим числом SQL-запросов попадают в журнал.
+METRICS_QUERY_BUDGET = int(os.getenv('METRICS_QUERY_BUDGET', default=30))
@@ -1,7 +1,16 @@
 from django.contrib import admin
 
+from core import similarity
+from core.admin_utils import ScalableAdmin, id_range_filter
 from .models import (Favorite, Follow, Ingredient, Recipe, RecipeIngredient,
-                     RecipeTag, Shoplist, Tag)
+                     RecipeTag, Shoplist, ShoppingListItem, Tag)
+
+
+def get_amounts(recipe):
+    return dict(
+        RecipeIngredient.objects.filter(recipe=recipe)
+        .values_list('ingredient_id', 'amount')
+    )
 
 
 class TagInline(admin.TabularInline):
@@ -10,24 +19,34 @@ class TagInline(admin.TabularInline):
 
 class IngredientInline(admin.TabularInline):
     model = RecipeIngredient
+    raw_id_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ScalableAdmin):
 
     inlines = [
         TagInline,
         IngredientInline
     ]
-    readonly_fields = ('favorite_count',)
-    list_display = ('name', 'author', )
-    list_filter = ('author', 'name', 'tags')
+    readonly_fields = ('favorites_count', 'in_carts_count')
+    list_display = ('name', 'author', 'favorites_count')
+    list_filter = (id_range_filter('author_id', 'id автора'), 'tags')
+    list_select_related = ('author',)
+    raw_id_fields = ('author',)
     search_fields = ('name',)
-    empty_value_display = '-пусто-'
 
-    def favorite_count(self, obj):
-        return Favorite.objects.filter(recipe=obj.pk).count()
-    favorite_count.short_description = "Добавлений в избранное"
+    def save_related(self, request, form, formsets, change):
+        # Строки состава сохраняются по одной, поэтому изменение
+        # переносится в корзины разом по разнице до и после.
+        recipe = form.instance
+        old_amounts = get_amounts(recipe) if change else {}
+        super().save_related(request, form, formsets, change)
+        if change:
+            ShoppingListItem.objects.apply_recipe_change(
+                recipe, old_amounts, get_amounts(recipe)
+            )
+        similarity.mark_changed([recipe.pk])
 
 
 @admin.register(Tag)
@@ -39,32 +58,45 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(ScalableAdmin):
     list_display = ('name', 'measurement_unit')
-    list_filter = ('name', )
-    search_fields = ('name',)
-    empty_value_display = '-пусто-'
+    search_fields = ('^name',)
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(ScalableAdmin):
     list_display = ('pk', 'user', 'recipe')
-    search_fields = ('user', 'recipe')
-    list_filter = ('user', 'recipe')
-    empty_value_display = '-пусто-'
+    search_fields = ('user__email', 'recipe__name')
+    list_filter = (id_range_filter('user_id', 'id пользователя'),
+                   id_range_filter('recipe_id', 'id рецепта'))
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
 
 
 @admin.register(Shoplist)
-class ShoplistAdmin(admin.ModelAdmin):
+class ShoplistAdmin(ScalableAdmin):
     list_display = ('pk', 'user', 'recipe')
-    search_fields = ('user', 'recipe')
-    list_filter = ('user', 'recipe')
-    empty_value_display = '-пусто-'
+    search_fields = ('user__email', 'recipe__name')
+    list_filter = (id_range_filter('user_id', 'id пользователя'),
+                   id_range_filter('recipe_id', 'id рецепта'))
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(ScalableAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'total_amount')
+    search_fields = ('user__email',)
+    list_filter = (id_range_filter('user_id', 'id пользователя'),)
+    list_select_related = ('user', 'ingredient')
+    readonly_fields = ('user', 'ingredient', 'total_amount')
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdmin):
     list_display = ('pk', 'user', 'following')
-    search_fields = ('user',)
-    list_filter = ('user',)
-    empty_value_display = '-пусто-'
+    search_fields = ('user__email', 'following__email')
+    list_filter = (id_range_filter('user_id', 'id подписчика'),
+                   id_range_filter('following_id', 'id автора'))
+    list_select_related = ('user', 'following')
+    raw_id_fields = ('user', 'following')
@@ -0,0 +1,170 @@
+"""Асинхронные версии самых частых запросов на чтение.
+
+Подключаются в urls.py при ASYNC_READ_VIEWS и имеют смысл только под
+ASGI. В Django 3.2 нет асинхронного ORM и кэша, поэтому в цикле событий
+целиком обслуживаются только справочники тегов и ингредиентов из памяти
+процесса, а страницы списка рецептов для анонимных пользователей
+берутся из кэша коротким обращением в пуле потоков. Остальное выполняет
+обычный синхронный view в пуле потоков, а не в единственном потоке,
+который Django отводит синхронным view под ASGI.
+"""
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+
+from core import recipe_cache, reference
+from core.ingredient_index import ingredient_index
+from .views import IngredientViewSet, RecipesViewSet, TagViewSet
+
+CONDITIONAL_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE')
+
+
+def json_response(data, status=200, **headers):
+    response = HttpResponse(
+        JSONRenderer().render(data),
+        status=status,
+        content_type='application/json',
+    )
+    for name, value in headers.items():
+        response[name.replace('_', '-')] = value
+    return response
+
+
+def in_thread(func):
+    """Запускает синхронную функцию в пуле потоков.
+
+    Соединения с базой закрываются в том же потоке, где открывались.
+    """
+    def call(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)
+
+
+def copy_view_attributes(source, target):
+    """Переносит признаки view DRF, по которым его узнают CSRF и метрики."""
+    target.csrf_exempt = True
+    target.cls = source.cls
+    target.actions = source.actions
+
+
+def run_sync_view(view):
+    def call(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    async def async_view(request, *args, **kwargs):
+        return await in_thread(call)(request, *args, **kwargs)
+    copy_view_attributes(view, async_view)
+    return async_view
+
+
+async def get_snapshot(registry):
+    snapshot = registry.get_fresh()
+    if snapshot is not None:
+        return snapshot
+    return await in_thread(registry.get)()
+
+
+def reference_view(registry, get_data, fallback):
+    """View справочника: данные берутся из снимка в памяти, проверка
+    версии уходит в поток не чаще раза в REFERENCE_DATA_CHECK_INTERVAL.
+    """
+    async def view(request, *args, **kwargs):
+        if request.method != 'GET':
+            return await fallback(request, *args, **kwargs)
+        snapshot = await get_snapshot(registry)
+        etag, last_modified = registry.get_validators(snapshot)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            data = get_data(request, snapshot, **kwargs)
+            if data is None:
+                return json_response(
+                    {'detail': str(NotFound.default_detail)}, status=404
+                )
+            response = json_response(data)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+    copy_view_attributes(fallback, view)
+    return view
+
+
+def get_item(request, snapshot, pk):
+    try:
+        return snapshot.payload_by_pk.get(int(pk))
+    except ValueError:
+        return None
+
+
+def get_tags(request, snapshot):
+    return snapshot.payload
+
+
+def get_ingredients(request, snapshot):
+    name = request.GET.get('name')
+    if name:
+        return ingredient_index.search(name, snapshot=snapshot)
+    return snapshot.payload
+
+
+tag_list = reference_view(
+    reference.tags, get_tags,
+    run_sync_view(TagViewSet.as_view({'get': 'list'})),
+)
+tag_detail = reference_view(
+    reference.tags, get_item,
+    run_sync_view(TagViewSet.as_view({'get': 'retrieve'})),
+)
+ingredient_list = reference_view(
+    reference.ingredients, get_ingredients,
+    run_sync_view(IngredientViewSet.as_view({'get': 'list'})),
+)
+ingredient_detail = reference_view(
+    reference.ingredients, get_item,
+    run_sync_view(IngredientViewSet.as_view({'get': 'retrieve'})),
+)
+
+recipe_list_sync = run_sync_view(
+    RecipesViewSet.as_view({'get': 'list', 'post': 'create'})
+)
+recipe_detail = run_sync_view(RecipesViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}))
+
+
+def cached_page(request):
+    key = recipe_cache.get_cache_key(request)
+    return recipe_cache.get_page(key, count_miss=False)
+
+
+async def recipe_list(request, *args, **kwargs):
+    """Список рецептов: страница из кэша отдаётся без синхронного view,
+    если запрос анонимный и тот взял бы её из кэша."""
+    if (request.method == 'GET'
+            and 'HTTP_AUTHORIZATION' not in request.META
+            and not request.GET.get('ordering')
+            and not any(header in request.META
+                        for header in CONDITIONAL_HEADERS)):
+        data = await in_thread(cached_page)(request)
+        if data is not None:
+            return json_response(data, X_Cache='HIT')
+    return await recipe_list_sync(request, *args, **kwargs)
+
+
+copy_view_attributes(recipe_list_sync, recipe_list)
@@ -1,9 +1,16 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
 from rest_framework import serializers
 
-from core.fields import Base64ImageField
+from core import recipe_cache, reference, similarity
+from core.fields import Base64ImageField, ReferencePrimaryKeyRelatedField
 from users.api.serializers import UserDetailSerializer
 from ..models import (Favorite, Follow, Ingredient, Recipe, RecipeIngredient,
-                      RecipeTag, Shoplist, Tag)
+                      RecipeTag, Shoplist, ShoppingListExport,
+                      ShoppingListItem, Tag)
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -20,11 +27,36 @@ class TagSerializer(serializers.ModelSerializer):
         model = Tag
 
 
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """Проверяет состав рецепта целиком.
+
+    Дубликаты ищутся по множеству, а все id ингредиентов разрешаются
+    разом, поэтому в ошибке перечисляются сразу все проблемные id.
+    """
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        counts = Counter(item['ingredient']['id'] for item in items)
+        duplicates = sorted(pk for pk, count in counts.items() if count > 1)
+        if duplicates:
+            raise serializers.ValidationError(
+                'Обнаружены дубликаты ингредиентов: {}!'
+                .format(', '.join(map(str, duplicates)))
+            )
+        found = reference.ingredients.resolve(list(counts))
+        missing = sorted(counts.keys() - found.keys())
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: {}.'
+                .format(', '.join(map(str, missing)))
+            )
+        for item in items:
+            item['ingredient']['id'] = found[item['ingredient']['id']]
+        return items
+
+
 class RecipeIngredientSerializer(serializers.HyperlinkedModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient.id',
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(source='ingredient.id')
     name = serializers.ReadOnlyField(
         source='ingredient.name'
     )
@@ -35,6 +67,7 @@ class RecipeIngredientSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
         fields = ('id', 'name', 'measurement_unit', 'amount')
         model = RecipeIngredient
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -53,20 +86,28 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         model = Recipe
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return Favorite.objects.filter(
             user=self.context['request'].user.id, recipe=obj.id
         ).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return Shoplist.objects.filter(
             user=self.context['request'].user.id, recipe=obj.id
         ).exists()
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(many=True,
-                                              queryset=Tag.objects.all())
+    tags = ReferencePrimaryKeyRelatedField(reference.tags, many=True)
     ingredients = RecipeIngredientSerializer(source='recipeingredient_set',
                                              many=True, )
     image = Base64ImageField()
@@ -96,33 +137,94 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         ]
         RecipeIngredient.objects.bulk_create(objs)
 
+    def update_ingredients(self, ingredients, instance):
+        """Применяет к составу рецепта только изменившиеся строки.
+
+        Возвращает старые и новые количества по id ингредиента
+        или None, если состав не изменился.
+        """
+        existing = {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.filter(recipe=instance)
+        }
+        old_amounts = {pk: item.amount for pk, item in existing.items()}
+        new_amounts = {
+            item['ingredient']['id'].pk: item['amount']
+            for item in ingredients
+        }
+        if old_amounts == new_amounts:
+            return None
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=instance, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for pk in old_amounts.keys() & new_amounts.keys():
+            if existing[pk].amount != new_amounts[pk]:
+                existing[pk].amount = new_amounts[pk]
+                changed.append(existing[pk])
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        self.create_ingredients(
+            [item for item in ingredients
+             if item['ingredient']['id'].pk not in old_amounts],
+            instance,
+        )
+        return old_amounts, new_amounts
+
+    def set_tags(self, tags, instance):
+        """Приводит теги рецепта к переданному набору.
+
+        Возвращает id удалённых тегов или None, если набор не изменился.
+        """
+        new_ids = {tag.pk for tag in tags}
+        old_ids = set(
+            RecipeTag.objects.filter(recipe=instance)
+            .values_list('tag_id', flat=True)
+        )
+        if old_ids == new_ids:
+            return None
+        removed = old_ids - new_ids
+        if removed:
+            RecipeTag.objects.filter(
+                recipe=instance, tag_id__in=removed
+            ).delete()
+        RecipeTag.objects.bulk_create(
+            [RecipeTag(recipe=instance, tag_id=pk)
+             for pk in new_ids - old_ids]
+        )
+        return removed
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('recipeingredient_set')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         self.create_ingredients(ingredients, recipe)
-        for tag in tags:
-            RecipeTag.objects.create(tag=tag, recipe=recipe)
+        RecipeTag.objects.bulk_create(
+            [RecipeTag(tag=tag, recipe=recipe) for tag in set(tags)]
+        )
+        recipe_cache.invalidate_recipe(recipe.pk, author_id=recipe.author_id)
+        similarity.mark_changed([recipe.pk])
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('recipeingredient_set')
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        self.create_ingredients(ingredients, instance)
+        tags = validated_data.pop('tags')
+        amounts = self.update_ingredients(ingredients, instance)
+        if amounts is not None:
+            ShoppingListItem.objects.apply_recipe_change(instance, *amounts)
+        removed_tags = self.set_tags(tags, instance)
+        if amounts is not None or removed_tags is not None:
+            # bulk_create и bulk_update не отправляют сигналы,
+            # поэтому кэш списков сбрасывается явно.
+            recipe_cache.invalidate_recipe(
+                instance.pk, removed_tags or (), instance.author_id
+            )
+            similarity.mark_changed([instance.pk])
         return super().update(instance, validated_data)
 
-    def validate(self, data):
-        ingredients = data.get('recipeingredient_set')
-        temp_list = []
-        for ingredient in ingredients:
-            if ingredient['ingredient']['id'] in temp_list:
-                raise serializers.ValidationError(
-                    'Обнаружен дубликат ингредиента: {}!'
-                    .format(ingredient['ingredient']['id'])
-                )
-            temp_list.append(ingredient['ingredient']['id'])
-        return data
-
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
@@ -132,6 +234,34 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         model = Recipe
 
 
+class PantryQuerySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.PANTRY_MAX_INGREDIENTS,
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+    tags = serializers.ListField(child=serializers.SlugField(),
+                                 required=False)
+
+
+class ShoppingListExportSerializer(serializers.ModelSerializer):
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        fields = ('id', 'status', 'created', 'finished', 'expires', 'error',
+                  'download')
+        model = ShoppingListExport
+
+    def get_download(self, obj):
+        if obj.status != ShoppingListExport.DONE:
+            return None
+        return self.context['request'].build_absolute_uri(
+            reverse('shopping_cart_exports-download', args=[obj.pk])
+        )
+
+
 class FollowSerializer(serializers.ModelSerializer):
     email = serializers.CharField(read_only=True,
                                   source='following.email')
@@ -148,6 +278,10 @@ class FollowSerializer(serializers.ModelSerializer):
     recipes_count = serializers.SerializerMethodField()
 
     def get_recipes(self, obj):
+        if hasattr(obj.following, 'recipe_list'):
+            return ShortRecipeSerializer(
+                obj.following.recipe_list, many=True
+            ).data
         try:
             recipes_limit = (self.context['request'].
                              query_params.get('recipes_limit'))
@@ -157,9 +291,7 @@ class FollowSerializer(serializers.ModelSerializer):
         return ShortRecipeSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(
-            author=obj.following.id
-        ).count()
+        return obj.following.recipes_count
 
     class Meta:
         fields = ('email', 'id', 'username', 'first_name',
@@ -1,10 +1,15 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (IngredientViewSet, RecipesViewSet, SubscribeView,
+from .views import (IngredientViewSet, RecipesViewSet,
+                    ShoppingListExportViewSet, SubscribeView,
                     SubscriptionsView, TagViewSet)
 
 router = DefaultRouter()
+# До рецептов: иначе адрес совпадёт с маршрутом recipes/{pk}/.
+router.register('recipes/shopping_cart_exports', ShoppingListExportViewSet,
+                basename='shopping_cart_exports')
 router.register('recipes', RecipesViewSet, basename='recipes')
 router.register('users/subscriptions', SubscriptionsView,
                 basename='subscriptions')
@@ -16,3 +21,15 @@ router.register('tags', TagViewSet, basename='tags')
 urlpatterns = [
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+        path('tags/', async_views.tag_list),
+        path('tags/<int:pk>/', async_views.tag_detail),
+        path('ingredients/', async_views.ingredient_list),
+        path('ingredients/<int:pk>/', async_views.ingredient_detail),
+    ] + urlpatterns
@@ -1,40 +1,85 @@
-import io
-
-from django.db.models import F, Sum
-from django.http import FileResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              Subquery, Value)
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django_filters import rest_framework
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from core.filters import IngredientsSearchFilter, RecipeFilter
-from core.pagination import CustomPagination
+from core import exports, recipe_cache, reference, similarity
+from core.filters import RecipeFilter
+from core.ingredient_index import ingredient_index
+from core.pagination import CustomPagination, ListPagination
+from core.pantry_index import pantry_index
+from core.pdf import render_shopping_list
 from core.permissions import IsAuthorOrReadOnly
-from ..models import Favorite, Follow, Ingredient, Recipe, Shoplist, Tag, User
+from core.recipe_import import import_recipes
+from core.versions import conditional, get_validators
+from ..models import (Favorite, Follow, Ingredient, Recipe, RecipeIngredient,
+                      Shoplist, ShoppingListExport, Tag, User)
 from .serializers import (FollowSerializer, IngredientSerializer,
-                          RecipeCreateUpdateSerializer, RecipeSerializer,
+                          PantryQuerySerializer, RecipeCreateUpdateSerializer,
+                          RecipeSerializer, ShoppingListExportSerializer,
                           ShortRecipeSerializer, TagSerializer)
 
 
-class TagViewSet(mixins.ListModelMixin,
+def reference_item_response(snapshot, pk):
+    try:
+        item = snapshot.payload_by_pk.get(int(pk))
+    except ValueError:
+        item = None
+    if item is None:
+        raise Http404
+    return Response(item)
+
+
+class ReferenceViewMixin:
+    """ETag и тело ответа справочника строятся по одному снимку, иначе
+    устаревший снимок процесса уйдёт клиенту под новым ETag."""
+    registry = None
+
+    def get_validators(self, request, *args, **kwargs):
+        self.snapshot = self.registry.get()
+        return self.registry.get_validators(self.snapshot)
+
+    @conditional
+    def retrieve(self, request, *args, **kwargs):
+        return reference_item_response(self.snapshot, kwargs['pk'])
+
+
+class TagViewSet(ReferenceViewMixin,
+                 mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,
                  viewsets.GenericViewSet):
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     permission_classes = (permissions.AllowAny, )
+    registry = reference.tags
 
+    @conditional
+    def list(self, request, *args, **kwargs):
+        return Response(self.snapshot.payload)
 
-class IngredientViewSet(viewsets.ModelViewSet):
+
+class IngredientViewSet(ReferenceViewMixin, viewsets.ModelViewSet):
     serializer_class = IngredientSerializer
     permission_classes = (permissions.AllowAny, )
-    filter_backends = [IngredientsSearchFilter, ]
-    search_fields = ('^name', )
     queryset = Ingredient.objects.all()
     http_method_names = ['get', ]
+    registry = reference.ingredients
+
+    @conditional
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(
+                ingredient_index.search(name, snapshot=self.snapshot)
+            )
+        return Response(self.snapshot.payload)
 
 
 class RecipesViewSet(viewsets.ModelViewSet):
@@ -45,6 +90,76 @@ class RecipesViewSet(viewsets.ModelViewSet):
     filter_backends = [rest_framework.DjangoFilterBackend, ]
     filter_fields = ('author', )
 
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_anonymous:
+            queryset = Recipe.objects.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                author_is_subscribed=Value(False, output_field=BooleanField()),
+            )
+        else:
+            queryset = Recipe.objects.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(Shoplist.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                author_is_subscribed=Exists(Follow.objects.filter(
+                    user=user, following=OuterRef('author')
+                )),
+            )
+        if self.action not in ('list', 'retrieve', 'pantry'):
+            return queryset
+        return queryset.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+
+    def get_validators(self, request, *args, **kwargs):
+        keys = ['tags', 'ingredients', 'users']
+        if request.user.is_authenticated:
+            keys.append(f'user:{request.user.pk}')
+        if self.action == 'list':
+            keys.append('recipes')
+            if request.query_params.get('ordering'):
+                keys.append('favorites')
+            return get_validators(keys, extra=[request.user.pk])
+        try:
+            modified = Recipe.objects.filter(
+                pk=kwargs['pk']
+            ).values_list('modified', flat=True).first()
+        except (TypeError, ValueError):
+            modified = None
+        if modified is None:
+            return None, None
+        return get_validators(
+            keys, extra=[request.user.pk, modified], modified=modified
+        )
+
+    @conditional
+    def list(self, request, *args, **kwargs):
+        if (not request.user.is_anonymous
+                or request.query_params.get('ordering')):
+            return super().list(request, *args, **kwargs)
+        key = recipe_cache.get_cache_key(request)
+        data = recipe_cache.get_page(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            recipe_cache.set_page(key, response.data)
+            response['X-Cache'] = 'MISS'
+        return response
+
+    @conditional
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def get_serializer_class(self):
         if self.action in ['create', 'partial_update']:
             return RecipeCreateUpdateSerializer
@@ -72,6 +187,7 @@ class RecipesViewSet(viewsets.ModelViewSet):
     @action(detail=True,
             methods=['post', 'delete'],
             url_path=r'shopping_cart')
+    @transaction.atomic
     def add_remove_shopping_list(self, request, pk):
         return self.add_remove_class_object(Shoplist, request, pk)
 
@@ -82,42 +198,11 @@ class RecipesViewSet(viewsets.ModelViewSet):
     )
     def download_shopping_list(self, request):
         user = get_object_or_404(User, pk=self.request.user.id)
-        shopping_list = (
-            Shoplist.objects
-            .filter(user=user.id)
-            .prefetch_related('recipe')
-            .values(
-                name=F('recipe__ingredients__name'),
-                unit=F(
-                    'recipe__recipeingredient__ingredient__measurement_unit'
-                )
-            )
-            .annotate(amount=Sum('recipe__recipeingredient__amount'))
-            .order_by('recipe__ingredients__name')
-        )
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer)
-        pdfmetrics.registerFont(TTFont('FreeSans', 'FreeSans.ttf'))
-        p.setFont('FreeSans', 12)
-        p.drawString(100, 750, '                              СПИСОК ПОКУПОК:')
-        p.drawString(100, 730, 'Название:')
-        p.drawString(400, 730, 'Кол-во:')
-        p.drawString(500, 730, 'Ед. изм.:')
-        y = 700
-        for item in shopping_list:
-            p.drawString(100, y, item['name'])
-            p.drawString(400, y, str(item['amount']))
-            p.drawString(500, y, item['unit'])
-            y -= 20
-            if y < 100:
-                p.showPage()
-                p.setFont('FreeSans', 12)
-                y = 700
-        p.showPage()
-        p.save()
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True,
-                            filename="shopping_list.pdf")
+        # Фронтенд ждёт здесь файл, поэтому PDF рисуется сразу. Для
+        # длинных списков есть фоновая выгрузка: shopping_cart_exports.
+        return FileResponse(render_shopping_list(exports.get_items(user)),
+                            as_attachment=True,
+                            filename='shopping_list.pdf')
 
     @action(detail=True,
             methods=['post', 'delete'],
@@ -125,15 +210,121 @@ class RecipesViewSet(viewsets.ModelViewSet):
     def add_delete_favorite(self, request, pk):
         return self.add_remove_class_object(Favorite, request, pk)
 
+    @action(detail=True, methods=['get'], url_path='similar')
+    def similar(self, request, pk):
+        """Рецепты с наибольшим числом общих ингредиентов и тегов."""
+        recipe = get_object_or_404(Recipe, pk=pk)
+        try:
+            limit = min(int(request.query_params['limit']),
+                        settings.SIMILAR_RECIPES_STORED)
+        except (KeyError, ValueError):
+            limit = settings.SIMILAR_RECIPES_LIMIT
+        ids = [pk for pk, _ in similarity.get_neighbors(recipe.pk)]
+        recipes = Recipe.objects.in_bulk(ids)
+        # Удалённые после пересчёта рецепты пропускаются.
+        found = [recipes[pk] for pk in ids if pk in recipes][:max(limit, 0)]
+        return Response(ShortRecipeSerializer(found, many=True).data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='pantry',
+        pagination_class=ListPagination,
+    )
+    def pantry(self, request):
+        """Рецепты по имеющимся ингредиентам.
+
+        Сначала рецепты, для которых есть большая доля ингредиентов.
+        Параметры: ingredients - id ингредиентов, max_missing - сколько
+        ингредиентов может не хватать, tags - слаги тегов.
+        """
+        query = PantryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        tag_ids = None
+        if query.validated_data.get('tags'):
+            slugs = set(query.validated_data['tags'])
+            tag_ids = [tag.pk for tag in reference.tags.get().objects
+                       if tag.slug in slugs]
+        ids, matched, missing = pantry_index.search(
+            query.validated_data['ingredients'],
+            query.validated_data.get('max_missing'),
+            tag_ids,
+        )
+        page = self.paginate_queryset(range(len(ids)))
+        page_ids = ids[page].tolist()
+        recipes = self.get_queryset().in_bulk(page_ids)
+        data = []
+        for position, pk in zip(page, page_ids):
+            recipe = recipes.get(pk)
+            # Рецепт удалён после построения индекса.
+            if recipe is None:
+                continue
+            item = self.get_serializer(recipe).data
+            item['matched_ingredients'] = int(matched[position])
+            item['missing_ingredients'] = int(missing[position])
+            data.append(item)
+        return self.get_paginated_response(data)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='import',
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def import_recipes(self, request):
+        """Импорт рецептов из тела запроса в формате NDJSON.
+
+        Каждая строка - рецепт в формате создания рецепта. Строки с
+        ошибками пропускаются и перечисляются в ответе.
+        """
+        lines = request.body.splitlines()
+        if len(lines) > settings.RECIPE_IMPORT_MAX_LINES:
+            return Response(
+                {'errors': 'Слишком много строк, максимум '
+                           f'{settings.RECIPE_IMPORT_MAX_LINES}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        created, errors = import_recipes(
+            request.user, lines, settings.RECIPE_IMPORT_BATCH_SIZE
+        )
+        return Response(
+            {'created': created, 'errors': errors},
+            status=(status.HTTP_201_CREATED if created
+                    else status.HTTP_400_BAD_REQUEST)
+        )
+
 
 class SubscriptionsView(mixins.ListModelMixin,
                         viewsets.GenericViewSet):
     pagination_class = CustomPagination
     serializer_class = FollowSerializer
 
+    def get_recipes_limit(self):
+        try:
+            limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return max(limit, 0)
+
     def get_queryset(self):
         user = get_object_or_404(User, pk=self.request.user.id)
-        return user.follower.all()
+        recipes = Recipe.objects.all()
+        limit = self.get_recipes_limit()
+        if limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(author=OuterRef('author'))
+                .order_by('-id').values('pk')[:limit]
+            ))
+        return (
+            user.follower
+            .select_related('following')
+            .prefetch_related(Prefetch(
+                'following__recipes',
+                queryset=recipes,
+                to_attr='recipe_list',
+            ))
+            .order_by('id')
+        )
 
 
 class SubscribeView(mixins.CreateModelMixin,
@@ -166,3 +357,41 @@ class SubscribeView(mixins.CreateModelMixin,
         following = get_object_or_404(User, pk=kwargs.get('user_id'))
         Follow.objects.filter(user=user, following=following).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ShoppingListExportViewSet(mixins.CreateModelMixin,
+                                mixins.RetrieveModelMixin,
+                                viewsets.GenericViewSet):
+    """Выгрузка списка покупок в PDF фоновой задачей.
+
+    POST ставит задачу в очередь, GET по id показывает её состояние,
+    download отдаёт готовый файл.
+    """
+    serializer_class = ShoppingListExportSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_queryset(self):
+        return exports.active().filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        job = exports.start_export(request.user)
+        return Response(
+            self.get_serializer(job).data,
+            status=(status.HTTP_200_OK
+                    if job.status == ShoppingListExport.DONE
+                    else status.HTTP_202_ACCEPTED),
+            headers={'Location': request.build_absolute_uri(
+                reverse('shopping_cart_exports-detail', args=[job.pk])
+            )},
+        )
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk):
+        job = self.get_object()
+        if job.status != ShoppingListExport.DONE:
+            return Response(
+                {"errors": "Файл ещё не готов"},
+                status=status.HTTP_409_CONFLICT
+            )
+        return FileResponse(job.file.open('rb'), as_attachment=True,
+                            filename='shopping_list.pdf')
@@ -0,0 +1,61 @@
+# Generated by Django 3.2 on 2026-10-17 19:19
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+# Модель, поле владельца строки и поле количества.
+INGREDIENT_REFERENCES = (
+    ('RecipeIngredient', 'recipe_id', 'amount'),
+    ('ShoppingListItem', 'user_id', 'total_amount'),
+)
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    duplicates = (
+        Ingredient.objects
+        .values('name', 'measurement_unit')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for group in duplicates:
+        keep_id = group['keep_id']
+        extra_ids = list(
+            Ingredient.objects
+            .filter(name=group['name'],
+                    measurement_unit=group['measurement_unit'])
+            .exclude(pk=keep_id)
+            .values_list('pk', flat=True)
+        )
+        for model_name, owner, amount in INGREDIENT_REFERENCES:
+            model = apps.get_model('recipes', model_name)
+            for row in model.objects.filter(ingredient_id__in=extra_ids):
+                kept = model.objects.filter(
+                    ingredient_id=keep_id, **{owner: getattr(row, owner)}
+                ).first()
+                if kept is None:
+                    row.ingredient_id = keep_id
+                    row.save(update_fields=['ingredient'])
+                    continue
+                setattr(kept, amount,
+                        getattr(kept, amount) + getattr(row, amount))
+                kept.save(update_fields=[amount])
+                row.delete()
+        Ingredient.objects.filter(pk__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_unit'),
+        ),
+    ]
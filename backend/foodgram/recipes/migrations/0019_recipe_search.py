@@ -0,0 +1,55 @@
+from django.db import migrations
+
+POSTGRESQL_FORWARD = (
+    """
+    ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector(
+            'russian', translate(coalesce(name, ''), 'ёЁ', 'еЕ')
+        ), 'A')
+        || setweight(to_tsvector(
+            'russian', translate(coalesce(text, ''), 'ёЁ', 'еЕ')
+        ), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX recipes_recipe_search_idx ON recipes_recipe '
+    'USING gin (search_vector)',
+)
+POSTGRESQL_BACKWARD = (
+    'DROP INDEX recipes_recipe_search_idx',
+    'ALTER TABLE recipes_recipe DROP COLUMN search_vector',
+)
+SQLITE_FORWARD = (
+    "CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5("
+    "name, text, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO recipes_recipe_fts (rowid, name, text) "
+    "SELECT id, replace(replace(name, 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(coalesce(text, ''), 'ё', 'е'), 'Ё', 'Е') "
+    "FROM recipes_recipe",
+)
+SQLITE_BACKWARD = (
+    'DROP TABLE recipes_recipe_fts',
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRESQL_FORWARD,
+                 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRESQL_BACKWARD,
+                 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2 on 2026-10-17 20:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0021_shoppinglistexport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeNeighborsQueue',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Рецепт в очереди пересчёта похожих',
+                'verbose_name_plural': 'Очередь пересчёта похожих рецептов',
+            },
+        ),
+    ]
@@ -1,7 +1,8 @@
 from decimal import Decimal
 
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
 
 from users.models import User
 
@@ -16,6 +17,12 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_name_unit'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -66,6 +73,20 @@ class Recipe(models.Model):
         verbose_name='Время приготовления',
         validators=[MinValueValidator(1), ],
     )
+    pub_date = models.DateTimeField(
+        auto_now_add=True, verbose_name='Дата публикации'
+    )
+    modified = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True,
+        verbose_name='Добавлений в избранное'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name='Добавлений в список покупок'
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -148,6 +169,7 @@ class Favorite(UserRecipe):
         verbose_name='Пользователь',
         related_name='favorited'
     )
+    counter_field = 'favorites_count'
 
     class Meta:
         verbose_name = 'Избранное'
@@ -161,6 +183,7 @@ class Shoplist(UserRecipe):
         verbose_name='Пользователь',
         related_name='shoplist'
     )
+    counter_field = 'in_carts_count'
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -193,3 +216,218 @@ class Follow(models.Model):
 
     def __str__(self):
         return (f'{self.user.username} подписан на {self.following.username}')
+
+
+class ShoppingListItemManager(models.Manager):
+    def apply_deltas(self, user_ids, deltas):
+        """Прибавляет к спискам покупок пользователей изменения количеств.
+
+        deltas - словарь {id ингредиента: изменение количества}.
+        Строки с нулевым или отрицательным итогом удаляются.
+        """
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic():
+            # select_for_update не блокирует строки, которых ещё нет,
+            # поэтому недостающие строки сначала вставляются с нулём:
+            # параллельная вставка той же строки дождётся этой транзакции
+            # и будет пропущена, а прибавка пойдёт через блокировку.
+            self.bulk_create(
+                [self.model(user_id=user_id, ingredient_id=ingredient_id,
+                            total_amount=0)
+                 for user_id in user_ids
+                 for ingredient_id, delta in deltas.items() if delta > 0],
+                ignore_conflicts=True,
+            )
+            to_update, to_delete = [], []
+            for item in self.select_for_update().filter(
+                user_id__in=user_ids, ingredient_id__in=deltas
+            ):
+                item.total_amount += deltas[item.ingredient_id]
+                if item.total_amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.pk)
+            self.bulk_update(to_update, ['total_amount'])
+            self.filter(pk__in=to_delete).delete()
+
+    def apply_recipe(self, recipe, sign, user_ids=None):
+        """Добавляет (sign=1) или убирает (sign=-1) ингредиенты рецепта.
+
+        По умолчанию изменяются списки всех пользователей, у которых
+        рецепт лежит в корзине.
+        """
+        if user_ids is None:
+            user_ids = self.cart_user_ids(recipe)
+        amounts = RecipeIngredient.objects.filter(
+            recipe=recipe
+        ).values_list('ingredient_id', 'amount')
+        self.apply_deltas(
+            user_ids, {pk: sign * amount for pk, amount in amounts}
+        )
+
+    def apply_recipe_change(self, recipe, old_amounts, new_amounts):
+        """Переносит в корзины изменение состава рецепта."""
+        deltas = {
+            pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+            for pk in old_amounts.keys() | new_amounts.keys()
+        }
+        self.apply_deltas(self.cart_user_ids(recipe), deltas)
+
+    def cart_user_ids(self, recipe):
+        return list(
+            Shoplist.objects.filter(recipe=recipe)
+            .values_list('user_id', flat=True)
+        )
+
+    def expected(self, user_ids):
+        """Считает списки покупок заново по корзинам пользователей."""
+        return (
+            Shoplist.objects
+            .filter(user_id__in=user_ids,
+                    recipe__recipeingredient__isnull=False)
+            .values(
+                'user_id',
+                ingredient_id=F('recipe__recipeingredient__ingredient'),
+            )
+            .annotate(total_amount=Sum('recipe__recipeingredient__amount'))
+            .order_by()
+        )
+
+    def rebuild(self, user_ids):
+        with transaction.atomic():
+            self.filter(user_id__in=user_ids).delete()
+            self.bulk_create(
+                (self.model(**row) for row in self.expected(user_ids)),
+                batch_size=1000,
+            )
+
+    def mismatched_user_ids(self, user_ids):
+        """Возвращает пользователей, чей список расходится с корзиной."""
+        actual = set(
+            self.filter(user_id__in=user_ids)
+            .values_list('user_id', 'ingredient_id', 'total_amount')
+        )
+        expected = {
+            (row['user_id'], row['ingredient_id'], row['total_amount'])
+            for row in self.expected(user_ids)
+        }
+        return {user_id for user_id, _, _ in actual ^ expected}
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        verbose_name='Количество'
+    )
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} {self.total_amount}'
+
+
+class RecipeNeighbors(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='neighbors',
+        verbose_name='Рецепт'
+    )
+    # Пары [id рецепта, сходство] по убыванию сходства.
+    neighbors = models.JSONField(default=list,
+                                 verbose_name='Похожие рецепты')
+
+    class Meta:
+        verbose_name = 'Похожие рецепты'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'Похожие на {self.recipe_id}'
+
+
+class RecipeNeighborsQueue(models.Model):
+    """Рецепты, чьих соседей нужно пересчитать после правки."""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+
+    class Meta:
+        verbose_name = 'Рецепт в очереди пересчёта похожих'
+        verbose_name_plural = 'Очередь пересчёта похожих рецептов'
+
+    def __str__(self):
+        return f'Пересчитать похожие на {self.recipe_id}'
+
+
+class ShoppingListExport(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Формируется'),
+        (DONE, 'Готов'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_exports',
+        verbose_name='Пользователь'
+    )
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=PENDING, db_index=True,
+                              verbose_name='Состояние')
+    cart_hash = models.CharField(max_length=64, db_index=True,
+                                 verbose_name='Хэш списка покупок')
+    # Позиции списка на момент запроса, очищаются после выгрузки.
+    items = models.JSONField(default=list, verbose_name='Позиции')
+    file = models.FileField(upload_to='exports/', blank=True,
+                            verbose_name='Файл')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Создана')
+    started = models.DateTimeField(null=True, blank=True,
+                                   verbose_name='Начата')
+    finished = models.DateTimeField(null=True, blank=True,
+                                    verbose_name='Завершена')
+    expires = models.DateTimeField(null=True, blank=True, db_index=True,
+                                   verbose_name='Хранится до')
+
+    class Meta:
+        verbose_name = 'Выгрузка списка покупок'
+        verbose_name_plural = 'Выгрузки списков покупок'
+        ordering = ['-id']
+
+    def __str__(self):
+        return f'Выгрузка {self.pk} ({self.get_status_display()})'
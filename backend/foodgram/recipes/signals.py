@@ -0,0 +1,190 @@
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from core import recipe_cache, reference, search
+from core.versions import bump_versions
+from users.models import User
+from .models import (Favorite, Follow, Ingredient, Recipe, RecipeIngredient,
+                     RecipeTag, Shoplist, ShoppingListItem, Tag)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    reference.ingredients.invalidate_on_commit()
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tags(**kwargs):
+    reference.tags.invalidate_on_commit()
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def bump_ingredients_version(**kwargs):
+    bump_versions('ingredients')
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def bump_tags_version(**kwargs):
+    bump_versions('tags')
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipes_version(**kwargs):
+    bump_versions('recipes')
+
+
+# Поля пользователя, которые выводятся в рецептах как поля автора.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def check_author_changed(instance, update_fields=None, **kwargs):
+    """Отмечает сохранения, которые меняют автора в ответах о рецептах.
+
+    Регистрация, правки пользователей без рецептов и полей, которых нет в
+    рецептах, кэш списков и ETag рецептов не сбрасывают. Удаление автора
+    сбрасывает их через каскадное удаление его рецептов.
+    """
+    instance._author_changed = False
+    if instance.pk is None or (
+        update_fields is not None
+        and not set(update_fields) & set(AUTHOR_FIELDS)
+    ):
+        return
+    old = User.objects.filter(
+        pk=instance.pk, recipes_count__gt=0
+    ).values(*AUTHOR_FIELDS).first()
+    instance._author_changed = old is not None and any(
+        old[field] != getattr(instance, field) for field in AUTHOR_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def bump_users_version(instance, **kwargs):
+    if getattr(instance, '_author_changed', False):
+        bump_versions('users')
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=Shoplist)
+@receiver([post_save, post_delete], sender=Follow)
+def bump_user_version(instance, **kwargs):
+    bump_versions(f'user:{instance.user_id}')
+
+
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_recipe_lists(**kwargs):
+    recipe_cache.bump_generations(recipe_cache.REFERENCE)
+
+
+@receiver(post_save, sender=User)
+def invalidate_recipe_lists_on_user(instance, **kwargs):
+    if getattr(instance, '_author_changed', False):
+        recipe_cache.bump_generations(recipe_cache.REFERENCE)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_recipe_lists_on_recipe(instance, **kwargs):
+    recipe_cache.invalidate_recipe(instance.pk, author_id=instance.author_id)
+
+
+@receiver([post_save, post_delete], sender=RecipeTag)
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def invalidate_recipe_lists_on_relation(instance, **kwargs):
+    tag_ids = [instance.tag_id] if isinstance(instance, RecipeTag) else []
+    recipe_cache.invalidate_recipe(instance.recipe_id, tag_ids)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_lists_on_tags(instance, action, reverse, pk_set,
+                                    **kwargs):
+    if action not in ('pre_clear', 'post_add', 'post_remove'):
+        return
+    if not reverse:
+        recipe_cache.invalidate_recipe(instance.pk, pk_set or ())
+        return
+    recipe_cache.bump_generations(f'tag:{instance.slug}')
+    for recipe_id in pk_set or Recipe.objects.filter(
+        tags=instance
+    ).values_list('pk', flat=True):
+        recipe_cache.invalidate_recipe(recipe_id)
+
+
+def change_counter(model, pk, field, delta):
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Shoplist)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, sender.counter_field, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Shoplist)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, sender.counter_field, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Shoplist)
+def add_to_shopping_list(instance, created, **kwargs):
+    if created:
+        ShoppingListItem.objects.apply_recipe(
+            instance.recipe_id, 1, [instance.user_id]
+        )
+
+
+@receiver(pre_save, sender=Shoplist)
+def move_shopping_list_entry(instance, **kwargs):
+    """Правка строки корзины в админке переносит рецепт между
+    списками покупок."""
+    if instance.pk is None:
+        return
+    old = Shoplist.objects.filter(pk=instance.pk).values_list(
+        'user_id', 'recipe_id'
+    ).first()
+    if old is None or old == (instance.user_id, instance.recipe_id):
+        return
+    ShoppingListItem.objects.apply_recipe(old[1], -1, [old[0]])
+    ShoppingListItem.objects.apply_recipe(
+        instance.recipe_id, 1, [instance.user_id]
+    )
+
+
+# pre_delete, а не post_delete: при удалении рецепта его состав удаляется
+# каскадом раньше строк корзины, а сигналы pre_delete приходят до всех
+# удалений, пока состав ещё на месте.
+@receiver(pre_delete, sender=Shoplist)
+def remove_from_shopping_list(instance, **kwargs):
+    ShoppingListItem.objects.apply_recipe(
+        instance.recipe_id, -1, [instance.user_id]
+    )
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+def bump_favorites_version(**kwargs):
+    bump_versions('favorites')
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def update_search_index(instance, **kwargs):
+    search.update_index([instance.pk])
@@ -0,0 +1,673 @@
+import json
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import reference
+from core.db_router import ReplicaRouter, query_counts
+from core.middleware import sticky_key_for
+from users.models import User
+from .models import (Follow, Ingredient, Recipe, RecipeIngredient,
+                     RecipeNeighbors, RecipeNeighborsQueue, RecipeTag,
+                     Shoplist, ShoppingListExport, ShoppingListItem, Tag)
+
+RECIPES = 100
+IMAGE = ('data:image/gif;base64,'
+         'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Читателев', password='pass',
+        )
+        authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}',
+                first_name='Автор', last_name=str(number), password='pass',
+            )
+            for number in range(3)
+        ]
+        Follow.objects.create(user=cls.reader, following=authors[0])
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                               slug=f'tag{number}')
+            for number in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(3)
+        ]
+        recipes = [
+            Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}', text='Текст', cooking_time=10,
+            )
+            for number in range(RECIPES)
+        ]
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in tags
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=Decimal('10'))
+            for recipe in recipes for ingredient in ingredients
+        ])
+
+    def count_queries(self, client, limit):
+        # Страницы списка для анонимов кэшируются, кэш не должен
+        # подменять запросы к базе.
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(queries)
+
+    def assert_constant(self, client):
+        # Первый запрос загружает справочники в память процесса.
+        self.count_queries(client, 1)
+        self.assertEqual(self.count_queries(client, 1),
+                         self.count_queries(client, RECIPES))
+
+    def test_anonymous(self):
+        self.assert_constant(APIClient())
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        self.assert_constant(client)
+
+    def test_subscription_state(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.get('/api/recipes/', {'limit': RECIPES})
+        subscribed = {
+            item['author']['username']: item['author']['is_subscribed']
+            for item in response.data['results']
+        }
+        self.assertEqual(subscribed, {
+            'author0': True, 'author1': False, 'author2': False,
+        })
+
+
+class ShoppingListSyncTest(TestCase):
+    """Списки покупок совпадают с корзинами при любых путях изменения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Авторов', password='pass',
+        )
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{number}@example.com', username=f'user{number}',
+                first_name='Покупатель', last_name=str(number),
+                password='pass',
+            )
+            for number in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Продукт {number}',
+                                      measurement_unit='г')
+            for number in range(3)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(author=cls.author, name=f'Блюдо {number}',
+                                  text='Текст', cooking_time=5)
+            for number in range(2)
+        ]
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=Decimal(number + 1))
+            for number, recipe in enumerate(cls.recipes)
+            for ingredient in cls.ingredients[number:]
+        ])
+
+    def assert_in_sync(self):
+        user_ids = [user.pk for user in self.users]
+        self.assertEqual(
+            ShoppingListItem.objects.mismatched_user_ids(user_ids), set()
+        )
+
+    def fill_carts(self):
+        for user in self.users:
+            for recipe in self.recipes:
+                Shoplist.objects.create(user=user, recipe=recipe)
+
+    def test_api_cart(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        url = f'/api/recipes/{self.recipes[0].pk}/shopping_cart/'
+        self.assertEqual(client.post(url).status_code, 201)
+        self.assertEqual(
+            ShoppingListItem.objects.filter(user=self.users[0]).count(), 3
+        )
+        self.assert_in_sync()
+        self.assertEqual(client.delete(url).status_code, 204)
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_download(self):
+        self.fill_carts()
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        response = client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content)
+                        .startswith(b'%PDF'))
+        self.assertFalse(ShoppingListExport.objects.exists())
+
+    def test_cart_rows(self):
+        self.fill_carts()
+        self.assert_in_sync()
+        Shoplist.objects.filter(user=self.users[0],
+                                recipe=self.recipes[1]).delete()
+        self.assert_in_sync()
+        entry = Shoplist.objects.get(user=self.users[1],
+                                     recipe=self.recipes[0])
+        entry.user = self.users[0]
+        entry.save()
+        self.assert_in_sync()
+
+    def test_recipe_delete(self):
+        self.fill_carts()
+        self.recipes[1].delete()
+        self.assert_in_sync()
+        self.assertEqual(
+            ShoppingListItem.objects.filter(user=self.users[0]).count(), 3
+        )
+
+    def test_api_recipe_delete(self):
+        self.fill_carts()
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.delete(f'/api/recipes/{self.recipes[0].pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_in_sync()
+
+    def test_author_delete(self):
+        self.fill_carts()
+        self.author.delete()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_admin_ingredients(self):
+        self.fill_carts()
+        admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin',
+            first_name='Админ', last_name='Админов', password='pass',
+        )
+        self.client.force_login(admin)
+        recipe = self.recipes[1]
+        rows = list(RecipeIngredient.objects.filter(recipe=recipe))
+        data = {
+            'name': recipe.name, 'text': recipe.text,
+            'cooking_time': recipe.cooking_time, 'author': self.author.pk,
+            'recipetag_set-TOTAL_FORMS': 0,
+            'recipetag_set-INITIAL_FORMS': 0,
+            'recipeingredient_set-TOTAL_FORMS': len(rows),
+            'recipeingredient_set-INITIAL_FORMS': len(rows),
+        }
+        for number, row in enumerate(rows):
+            prefix = f'recipeingredient_set-{number}-'
+            data.update({
+                f'{prefix}id': row.pk, f'{prefix}recipe': recipe.pk,
+                f'{prefix}ingredient': row.ingredient_id,
+                f'{prefix}amount': '7',
+            })
+        data[f'recipeingredient_set-{len(rows) - 1}-DELETE'] = 'on'
+        response = self.client.post(
+            f'/admin/recipes/recipe/{recipe.pk}/change/', data
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(recipe.recipeingredient_set.values_list('amount',
+                                                         flat=True)),
+            [Decimal('7')],
+        )
+        self.assert_in_sync()
+
+
+class SimilarRecipesQueueTest(TestCase):
+    """Правка рецепта ставит его в очередь, пересчёт идёт вне запроса."""
+
+    # На двух рецептах любой признак частый, поэтому порог снят.
+    @override_settings(SIMILAR_RECIPES_MAX_SHARE=1)
+    def test_update_queues_recipe(self):
+        author = User.objects.create_user(
+            email='chef@example.com', username='chef',
+            first_name='Повар', last_name='Поваров', password='pass',
+        )
+        tag = Tag.objects.create(name='Ужин', color='#000000', slug='dinner')
+        ingredients = [
+            Ingredient.objects.create(name=f'Овощ {number}',
+                                      measurement_unit='г')
+            for number in range(3)
+        ]
+        recipes = [
+            Recipe.objects.create(author=author, name=f'Салат {number}',
+                                  text='Текст', cooking_time=5)
+            for number in range(2)
+        ]
+        for recipe in recipes:
+            RecipeTag.objects.create(recipe=recipe, tag=tag)
+            RecipeIngredient.objects.create(recipe=recipe,
+                                            ingredient=ingredients[0],
+                                            amount=Decimal('1'))
+        self.assertFalse(RecipeNeighborsQueue.objects.exists())
+        client = APIClient()
+        client.force_authenticate(author)
+        response = client.patch(f'/api/recipes/{recipes[0].pk}/', {
+            'ingredients': [{'id': ingredients[0].pk, 'amount': 2},
+                            {'id': ingredients[1].pk, 'amount': 3}],
+            'tags': [tag.pk], 'name': 'Салат', 'text': 'Текст',
+            'cooking_time': 5,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(RecipeNeighborsQueue.objects.values_list('pk', flat=True)),
+            [recipes[0].pk],
+        )
+        self.assertFalse(RecipeNeighbors.objects.exists())
+        call_command('run_similar_recipes_worker', '--once',
+                     stdout=StringIO())
+        self.assertFalse(RecipeNeighborsQueue.objects.exists())
+        self.assertEqual(
+            [pk for pk, _ in RecipeNeighbors.objects.get(
+                pk=recipes[0].pk
+            ).neighbors],
+            [recipes[1].pk],
+        )
+
+
+class ConditionalGetTest(TestCase):
+    """ETag ответов меняется вместе с данными, иначе ответ - 304."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='baker@example.com', username='baker',
+            first_name='Пекарь', last_name='Пекарев', password='pass',
+        )
+        cls.tag = Tag.objects.create(name='Выпечка', color='#FF0000',
+                                     slug='bakery')
+        cls.ingredient = Ingredient.objects.create(name='Мука',
+                                                   measurement_unit='г')
+        cls.recipes = [
+            Recipe.objects.create(author=cls.author, name=f'Пирог {number}',
+                                  text='Текст', cooking_time=30)
+            for number in range(2)
+        ]
+        for recipe in cls.recipes:
+            RecipeTag.objects.create(recipe=recipe, tag=cls.tag)
+            RecipeIngredient.objects.create(recipe=recipe,
+                                            ingredient=cls.ingredient,
+                                            amount=Decimal('500'))
+
+    def setUp(self):
+        cache.clear()
+        reference.tags.invalidate()
+        reference.ingredients.invalidate()
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_tags(self):
+        client = APIClient()
+        response = client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.revalidate(client, '/api/tags/', response).status_code, 304
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Ужин', color='#0000FF', slug='dinner')
+        changed = self.revalidate(client, '/api/tags/', response)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.data), 2)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_recipe_detail(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        url = f'/api/recipes/{self.recipes[0].pk}/'
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        other = f'/api/recipes/{self.recipes[1].pk}/'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.patch(other, {
+                'ingredients': [{'id': self.ingredient.pk, 'amount': 10}],
+                'tags': [self.tag.pk], 'name': 'Другой пирог',
+                'text': 'Текст', 'cooking_time': 20,
+            }, format='json').status_code, 200)
+        # Правка другого рецепта не меняет ETag этого.
+        self.assertEqual(self.revalidate(client, url, response).status_code,
+                         304)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(url, {
+                'ingredients': [{'id': self.ingredient.pk, 'amount': 10}],
+                'tags': [self.tag.pk], 'name': 'Новый пирог',
+                'text': 'Текст', 'cooking_time': 20,
+            }, format='json')
+        changed = self.revalidate(client, url, response)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data['name'], 'Новый пирог')
+
+    def test_recipe_list_per_user(self):
+        reader = User.objects.create_user(
+            email='eater@example.com', username='eater',
+            first_name='Едок', last_name='Едоков', password='pass',
+        )
+        anonymous = APIClient()
+        client = APIClient()
+        client.force_authenticate(reader)
+        response = client.get('/api/recipes/')
+        self.assertNotEqual(anonymous.get('/api/recipes/')['ETag'],
+                            response['ETag'])
+        self.assertEqual(
+            self.revalidate(client, '/api/recipes/', response).status_code,
+            304,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f'/api/recipes/{self.recipes[0].pk}/favorite/')
+        changed = self.revalidate(client, '/api/recipes/', response)
+        self.assertEqual(changed.status_code, 200)
+        self.assertTrue(any(
+            item['is_favorited'] for item in changed.data['results']
+        ))
+
+
+class RecipeListCacheTest(TestCase):
+    """Кэш страниц для анонимов сбрасывается только там, где нужно."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(
+                email=f'cook{number}@example.com', username=f'cook{number}',
+                first_name='Кулинар', last_name=str(number), password='pass',
+            )
+            for number in range(2)
+        ]
+        cls.tags = [
+            Tag.objects.create(name=f'Раздел {number}',
+                               color=f'#11111{number}', slug=f'part{number}')
+            for number in range(2)
+        ]
+        for author, tag in zip(cls.authors, cls.tags):
+            recipe = Recipe.objects.create(author=author, name='Суп',
+                                           text='Текст', cooking_time=40)
+            RecipeTag.objects.create(recipe=recipe, tag=tag)
+
+    def setUp(self):
+        cache.clear()
+        reference.tags.invalidate()
+        self.client = APIClient()
+
+    def get(self, **params):
+        return self.client.get('/api/recipes/', params)['X-Cache']
+
+    def warm(self):
+        pages = ({}, {'author': self.authors[1].pk},
+                 {'tags': self.tags[1].slug})
+        for params in pages:
+            self.assertEqual(self.get(**params), 'MISS')
+            self.assertEqual(self.get(**params), 'HIT')
+
+    def test_new_recipe(self):
+        self.warm()
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(author=self.authors[0],
+                                           name='Каша', text='Текст',
+                                           cooking_time=10)
+            RecipeTag.objects.create(recipe=recipe, tag=self.tags[0])
+        self.assertEqual(self.get(), 'MISS')
+        self.assertEqual(self.get(author=self.authors[0].pk), 'MISS')
+        self.assertEqual(self.get(author=self.authors[1].pk), 'HIT')
+        self.assertEqual(self.get(tags=self.tags[1].slug), 'HIT')
+
+    def test_users_without_recipes(self):
+        self.warm()
+        with self.captureOnCommitCallbacks(execute=True):
+            reader = User.objects.create_user(
+                email='new@example.com', username='newcomer',
+                first_name='Новичок', last_name='Новиков', password='pass',
+            )
+            reader.first_name = 'Другое имя'
+            reader.save()
+        self.assertEqual(self.get(), 'HIT')
+
+    def test_author_rename(self):
+        self.warm()
+        author = User.objects.get(pk=self.authors[1].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save(update_fields=['last_login'])
+        self.assertEqual(self.get(), 'HIT')
+        author.first_name = 'Шеф'
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+        response = self.client.get('/api/recipes/',
+                                   {'author': author.pk})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(
+            response.data['results'][0]['author']['first_name'], 'Шеф'
+        )
+
+
+class StaleReferenceTest(TestCase):
+    """Процесс с устаревшим снимком справочника отвечает согласованно."""
+
+    def setUp(self):
+        reference.tags.invalidate()
+        self.tag = Tag.objects.create(name='Завтрак', color='#00FF00',
+                                      slug='breakfast')
+        self.stale = reference.tags.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.new_tag = Tag.objects.create(name='Обед', color='#0000FF',
+                                              slug='lunch')
+        # Так снимок выглядит в процессе, который ещё не проверил версию.
+        reference.tags._snapshot = self.stale
+        reference.tags._checked_at = time.monotonic()
+
+    def tearDown(self):
+        reference.tags.invalidate()
+
+    def test_etag_matches_body(self):
+        response = APIClient().get('/api/tags/')
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response['ETag'],
+                         reference.tags.get_validators(self.stale)[0])
+
+    def test_new_tag_accepted(self):
+        author = User.objects.create_user(
+            email='fresh@example.com', username='fresh',
+            first_name='Свежий', last_name='Повар', password='pass',
+        )
+        ingredient = Ingredient.objects.create(name='Яйцо',
+                                               measurement_unit='шт')
+        client = APIClient()
+        client.force_authenticate(author)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        with self.settings(MEDIA_ROOT=media.name):
+            response = client.post('/api/recipes/', {
+                'ingredients': [{'id': ingredient.pk, 'amount': 2}],
+                'tags': [self.new_tag.pk], 'name': 'Омлет', 'text': 'Текст',
+                'cooking_time': 5,
+                'image': IMAGE,
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+
+class CursorPaginationTest(TestCase):
+    """Курсор работает только при сортировке по первичному ключу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='writer@example.com', username='writer',
+            first_name='Автор', last_name='Писателев', password='pass',
+        )
+        Recipe.objects.bulk_create([
+            Recipe(author=author, name=f'Салат {number}', text='Текст',
+                   cooking_time=5)
+            for number in range(5)
+        ])
+
+    def test_pages(self):
+        client = APIClient()
+        first = client.get('/api/recipes/', {'cursor': '', 'limit': 3})
+        self.assertEqual(first.status_code, 200)
+        second = client.get(first.data['next'])
+        ids = [item['id'] for item in first.data['results']
+               + second.data['results']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_unstable_ordering(self):
+        client = APIClient()
+        for params in ({'ordering': 'popular'}, {'search': 'салат'}):
+            response = client.get('/api/recipes/', {'cursor': '', **params})
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('cursor', response.data)
+            self.assertEqual(
+                client.get('/api/recipes/', params).status_code, 200
+            )
+
+
+class RecipeImportTest(TestCase):
+    """Ошибка в строке импорта не мешает остальным строкам."""
+
+    def test_bad_lines(self):
+        author = User.objects.create_user(
+            email='partner@example.com', username='partner',
+            first_name='Партнёр', last_name='Партнёров', password='pass',
+        )
+        tag = Tag.objects.create(name='Гарнир', color='#00FFFF',
+                                 slug='garnish')
+        ingredient = Ingredient.objects.create(name='Рис',
+                                               measurement_unit='г')
+        good = json.dumps({
+            'ingredients': [{'id': ingredient.pk, 'amount': 100}],
+            'tags': [tag.pk], 'name': 'Рис отварной', 'text': 'Текст',
+            'cooking_time': 20, 'image': IMAGE,
+        }, ensure_ascii=False).encode()
+        body = b'\n'.join([b'\xff\xfe{', good, b'{not json'])
+        client = APIClient()
+        client.force_authenticate(author)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        with self.settings(MEDIA_ROOT=media.name):
+            response = client.generic(
+                'POST', '/api/recipes/import/', body,
+                content_type='application/x-ndjson',
+            )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(
+            [error['line'] for error in response.data['errors']], [1, 3]
+        )
+        self.assertTrue(Recipe.objects.filter(name='Рис отварной').exists())
+
+
+@skipUnless(settings.DATABASE_REPLICAS,
+            'Нужна реплика: DB_REPLICAS и общий CACHE_BACKEND')
+class ReplicaRoutingTest(TransactionTestCase):
+    """Чтения идут в реплику, а после записи и входа - в основную базу.
+
+    В TestCase все запросы идут внутри транзакции основной базы и
+    маршрутизатор не выбирает реплику, поэтому здесь TransactionTestCase.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        reference.tags.invalidate()
+        reference.ingredients.invalidate()
+        self.replica = settings.DATABASE_REPLICAS[0]
+        self.user = User.objects.create_user(
+            email='router@example.com', username='router',
+            first_name='Маршрут', last_name='Маршрутов', password='pass',
+        )
+
+    def count(self, client, method, url, **kwargs):
+        """Запросы к основной базе без запросов кэша и число запросов
+        к реплике по счётчикам псевдонимов."""
+        before = query_counts().get(self.replica, 0)
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+            response = getattr(client, method)(url, **kwargs)
+        table = settings.CACHES['default']['LOCATION']
+        return response, [
+            query['sql'] for query in primary.captured_queries
+            if query['sql'].startswith(('SELECT', 'INSERT', 'UPDATE',
+                                        'DELETE'))
+            and not (table and table in query['sql'])
+        ], query_counts().get(self.replica, 0) - before
+
+    def test_reads_from_replica(self):
+        response, primary, replica = self.count(
+            APIClient(), 'get', '/api/recipes/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, [])
+        self.assertGreater(replica, 0)
+
+    def test_write_pins_client(self):
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        tag = Tag.objects.create(name='Суп', color='#123456', slug='soup')
+        recipe = Recipe.objects.create(author=self.user, name='Борщ',
+                                       text='Текст', cooking_time=60)
+        RecipeTag.objects.create(recipe=recipe, tag=tag)
+        response, _, _ = self.count(
+            client, 'post', f'/api/recipes/{recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 201)
+        response, primary, replica = self.count(
+            client, 'get', '/api/recipes/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(primary)
+        self.assertEqual(replica, 0)
+        # Привязка касается только клиента, который писал.
+        _, _, replica = self.count(APIClient(), 'get', '/api/recipes/')
+        self.assertGreater(replica, 0)
+
+    def test_login_token_read_from_primary(self):
+        response = APIClient().post('/api/auth/token/login/', {
+            'email': self.user.email, 'password': 'pass',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        key = response.data['auth_token']
+        self.assertTrue(cache.get(sticky_key_for(f'Token {key}')))
+        cache.clear()
+        self.assertEqual(
+            ReplicaRouter().db_for_read(Token), DEFAULT_DB_ALIAS
+        )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+        response, primary, replica = self.count(
+            client, 'get', '/api/users/me/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(primary), 1)
+        self.assertIn('authtoken_token', primary[0])
+        self.assertGreater(replica, 0)
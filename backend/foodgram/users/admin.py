@@ -1,14 +1,17 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from core.admin_utils import EstimatedCountPaginator
 from .models import User
 
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('email', 'username', 'first_name', 'last_name', 'is_staff')
-    list_filter = ('email', 'username')
+    list_filter = ('is_staff', 'is_active')
     search_fields = ('email', 'username')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(User, CustomUserAdmin)
@@ -16,6 +16,8 @@ class UserDetailSerializer(BaseUserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Follow.objects.filter(
             user=self.context['request'].user.id,
             following=obj.id